@@ -0,0 +1,79 @@
+"""
+Noise estimation for adaptive per-view sample budgets.
+
+A view is rendered as two independent half-sample renders (different seeds).
+Their mean is the image, and their difference is pure Monte Carlo noise:
+edges and texture are identical in both, so they cancel exactly, unlike a
+single-image estimate that can't tell fine detail from noise.
+estimate_tile_noise turns the difference into per-tile noise, and only the
+tiles above the target threshold are re-rendered with more samples (see
+sphere_cams.render_view).
+"""
+import math
+import numpy as np
+
+
+def to_gray(img):
+    img = np.asarray(img, dtype=np.float32)
+    if img.ndim == 3:
+        # ignore alpha
+        img = img[..., :3].mean(axis=-1)
+    return img
+
+
+def _half_difference(img_a, img_b):
+    """
+    (H, W) squared noise of the mean of two independent renders: Var(a - b) = 4 Var((a + b) / 2)
+    """
+    return (to_gray(img_a) - to_gray(img_b)) ** 2 / 4
+
+
+def estimate_noise(img_a, img_b):
+    """
+    Standard deviation of the noise in (img_a + img_b) / 2 (values in [0, 1]),
+    from two renders of the same view with independent seeds
+    """
+    return float(np.sqrt(_half_difference(img_a, img_b).mean()))
+
+
+def estimate_tile_noise(img_a, img_b, tile_size: int = 32):
+    """
+    returns (H // tile_size, W // tile_size) per-tile noise estimates of the
+    mean of img_a and img_b, rows in the same order as the images
+    """
+    sq = _half_difference(img_a, img_b)
+    h, w = sq.shape
+    th, tw = h // tile_size, w // tile_size
+    tiles = sq[:th * tile_size, :tw * tile_size].reshape(th, tile_size, tw, tile_size)
+
+    return np.sqrt(tiles.mean(axis=(1, 3)))
+
+
+def noisy_region(tile_noise, threshold: float, tile_size: int = 32):
+    """
+    Pixel bounding box (x0, y0, x1, y1) of all tiles above threshold, or None
+    if every tile is within budget.
+    """
+    rows, cols = np.nonzero(tile_noise > threshold)
+    if len(rows) == 0:
+        return None
+
+    return (int(cols.min()) * tile_size, int(rows.min()) * tile_size,
+            (int(cols.max()) + 1) * tile_size, (int(rows.max()) + 1) * tile_size)
+
+
+def region_tiles(region, tile_size: int = 32):
+    """
+    (row, col) slices of the tiles a noisy_region box covers
+    """
+    x0, y0, x1, y1 = region
+    return slice(y0 // tile_size, y1 // tile_size), slice(x0 // tile_size, x1 // tile_size)
+
+
+def next_samples(samples: int, noise: float, threshold: float, max_samples: int):
+    """
+    Monte Carlo noise falls like 1 / sqrt(samples), so reaching threshold from
+    noise needs (noise / threshold)**2 times the samples. Always at least doubles.
+    """
+    factor = max(2.0, (noise / threshold) ** 2)
+    return int(min(max_samples, math.ceil(samples * factor)))
@@ -0,0 +1,213 @@
+"""
+Benchmarks for the pose / intrinsics / transforms.json export path, runnable
+without Blender. FakeScene / FakeCamera stand in for the bpy attributes that
+get_camera_info reads.
+
+    python bench.py                      # run and compare with bench_baselines.json
+    python bench.py --update-baseline    # run and store the timings as the new baseline
+    python bench.py --sizes 100 1000     # fewer / other frame counts
+
+Exits non-zero if any benchmark is more than --tolerance slower than its
+baseline, or if there is no baseline yet (timings are machine specific, so
+none is committed: record one with --update-baseline first).
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from get_camera_info import (TransformsWriter, add_to_json_file, get_camera_extrinsics,
+                             get_camera_intrinsics, listify_matrix, save_json)
+from poses import get_rot_matrix, look_at, orbit_positions, sample_poses
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json")
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeScene:
+    def __init__(self, width: int = 512, height: int = 512):
+        self.render = _Namespace(resolution_x=width, resolution_y=height, resolution_percentage=100,
+                                 pixel_aspect_x=1.0, pixel_aspect_y=1.0)
+
+
+class FakeCamera:
+    """
+    Mimics a bpy camera object: .data lens/sensor settings and a row-iterable matrix_world.
+    """
+    def __init__(self, FOV: float = 90, matrix_world=None):
+        angle = math.radians(FOV)
+        self.data = _Namespace(angle_x=angle, angle_y=angle, lens=18.0, sensor_fit='AUTO',
+                               sensor_width=36.0, sensor_height=24.0)
+        self.matrix_world = matrix_world if matrix_world is not None else [list(row) for row in np.eye(4)]
+
+
+def _legacy_orbit(num_frames: int):
+    """
+    The old per-frame path: three get_rot_matrix calls per frame, as rotate_camera did.
+    """
+    origin = np.array([math.sqrt(30), 0, 0])
+    for i in range(num_frames):
+        angle = 2 * math.pi * i / num_frames
+        location = np.dot(origin, get_rot_matrix(0, 'Z'))
+        location = np.dot(origin, get_rot_matrix(angle / 2, 'Y'))
+        location = np.dot(location, get_rot_matrix(angle, 'Z'))
+
+
+def _vectorized_orbit(num_frames: int):
+    angles = 2 * math.pi * np.arange(num_frames) / num_frames
+    look_at(orbit_positions(angles, angles / 2, math.sqrt(30)))
+
+
+def _fibonacci(num_frames: int):
+    sample_poses('fibonacci', num_frames)
+
+
+def _intrinsics(num_frames: int):
+    scene, camera = FakeScene(), FakeCamera()
+    for _ in range(num_frames):
+        get_camera_intrinsics(scene, camera)
+
+
+def _extrinsics(num_frames: int):
+    scene = FakeScene()
+    cameras = [FakeCamera(matrix_world=pose) for pose in sample_poses('fibonacci', 64)[0]]
+    for i in range(num_frames):
+        get_camera_extrinsics(scene, cameras[i % len(cameras)], f"view_{i:06d}.png")
+
+
+def _listify(num_frames: int):
+    c2w = sample_poses('fibonacci', num_frames)[0]
+    for pose in c2w:
+        listify_matrix(pose)
+
+
+def _transforms(num_frames: int):
+    c2w = sample_poses('fibonacci', num_frames)[0]
+    intrinsics = get_camera_intrinsics(FakeScene(), FakeCamera())
+    frames = [{'file_path': f"view_{i:06d}.png", 'transform_matrix': listify_matrix(pose)} for i, pose in enumerate(c2w)]
+    return {**intrinsics, 'frames': frames}
+
+
+def _save_json(num_frames: int, tmp_dir: str):
+    save_json(_transforms(num_frames), os.path.join(tmp_dir, "transforms.json"))
+
+
+def _add_to_json_file(num_frames: int, tmp_dir: str):
+    filename = os.path.join(tmp_dir, "frames.json")
+    frames = _transforms(num_frames)['frames']
+    add_to_json_file(filename, frames[0], wipe=True)
+    for frame in frames[1:]:
+        add_to_json_file(filename, frame)
+
+
+def _transforms_writer(num_frames: int, tmp_dir: str):
+    transforms = _transforms(num_frames)
+    frames = transforms.pop('frames')
+    with TransformsWriter(os.path.join(tmp_dir, "transforms.json"), transforms) as writer:
+        for frame in frames:
+            writer.append(frame)
+
+
+# name -> (function, needs a temp dir, largest size worth running)
+BENCHMARKS = {
+    'legacy_orbit_rot_matrix': (_legacy_orbit, False, 100000),
+    'vectorized_orbit': (_vectorized_orbit, False, None),
+    'fibonacci_poses': (_fibonacci, False, None),
+    'get_camera_intrinsics': (_intrinsics, False, None),
+    'get_camera_extrinsics': (_extrinsics, False, None),
+    'listify_matrix': (_listify, False, None),
+    'save_json': (_save_json, True, None),
+    'add_to_json_file': (_add_to_json_file, True, 10000),
+    'transforms_writer': (_transforms_writer, True, 10000),
+}
+
+
+def time_benchmark(fn, num_frames: int, needs_tmp: bool, repeats: int = 3):
+    """
+    best of repeats, in seconds
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            args = (num_frames, tmp_dir) if needs_tmp else (num_frames,)
+            start = time.perf_counter()
+            fn(*args)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes=DEFAULT_SIZES, names=None, repeats: int = 3):
+    results = {}
+    for name, (fn, needs_tmp, max_size) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = {}
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+            seconds = time_benchmark(fn, size, needs_tmp, repeats)
+            results[name][str(size)] = seconds
+            print(f"{name:<26} {size:>7} frames  {seconds * 1000:10.2f} ms  {seconds / size * 1e6:8.2f} us/frame")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    returns a list of (name, size, seconds, baseline seconds) that regressed
+    """
+    regressions = []
+    for name, sizes in results.items():
+        for size, seconds in sizes.items():
+            base = baseline.get(name, {}).get(size)
+            if base is not None and seconds > base * (1 + tolerance):
+                regressions.append((name, size, seconds, base))
+    return regressions
+
+
+def check(results: dict, baseline_path: str = BASELINE_PATH, tolerance: float = 0.25, update: bool = False):
+    """
+    Compares results with the baseline file, or stores them as the new
+    baseline if update. returns the exit code: 1 on regressions or a missing baseline
+    """
+    if update:
+        with open(baseline_path, 'w') as file:
+            json.dump(results, file, indent=4)
+        print(f"saved baseline to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"no baseline at {baseline_path}, run with --update-baseline first")
+        return 1
+
+    with open(baseline_path, 'r') as file:
+        baseline = json.load(file)
+
+    regressions = compare(results, baseline, tolerance)
+    for name, size, seconds, base in regressions:
+        print(f"REGRESSION {name} @ {size}: {seconds * 1000:.2f} ms vs. baseline {base * 1000:.2f} ms")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--only", nargs="+", default=None, choices=list(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. baseline, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.only, args.repeats)
+    sys.exit(check(results, args.baseline, args.tolerance, args.update_baseline))
@@ -0,0 +1,213 @@
+"""
+Single entry point for the pipeline stages. Only argparse is imported up
+front; each subcommand imports what it needs (numpy, torch, nerfstudio)
+when it runs, so `cli.py --help` and the light subcommands start instantly.
+Rendering runs Blender as a subprocess, bpy is never imported here.
+
+    python cli.py render ../mesh_dir outputs --rot-res 6
+    python cli.py plan ../mesh_dir outputs && python cli.py render ../mesh_dir outputs --pose-file "outputs/{mesh}/planned_poses.npz"
+    python cli.py postprocess outputs --workers 8
+    python cli.py export outputs/bunny/poses.npz outputs/bunny/transforms.json
+    python cli.py train outputs/bunny outputs/teapot --devices 0 1
+    python cli.py eval outputs/bunny/splatfacto/<run>/config.yml outputs/bunny/transforms.json evals/bunny
+    python cli.py render-model outputs/bunny/splatfacto/<run>/config.yml test_poses.json renders/bunny
+    python cli.py pipeline ../mesh_dir work --devices 0 1
+    python cli.py bench --sizes 100 1000
+"""
+import os
+import sys
+import json
+import argparse
+
+# modules are imported flat (as the scripts in this directory do), wherever cli.py is run from
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def cmd_render(args):
+    import pathlib
+    import subprocess
+    from pipeline import BLENDER_COMMAND, render_command
+
+    stl_fnames = args.stl or sorted(str(path) for path in pathlib.Path(args.mesh_dir).glob('**/*.stl'))
+    if not stl_fnames:
+        print(f"no STL files in {args.mesh_dir}", file=sys.stderr)
+        return 1
+    params = {'rot_res': args.rot_res, 'FOV': args.fov, 'max_faces': args.max_faces, 'sampler': args.sampler,
+              'sampler_kwargs': args.sampler_kwargs, 'transparent': args.transparent, 'pose_file': args.pose_file,
+              'passes': args.passes}
+    blender = [args.blender] + BLENDER_COMMAND[1:] if args.blender else BLENDER_COMMAND
+
+    return subprocess.run(render_command(stl_fnames, args.output, params, blender)).returncode
+
+
+def cmd_plan(args):
+    from view_planning import plan_dir
+
+    plan_dir(args.mesh_dir, args.output_dir, num_candidates=args.candidates, target_coverage=args.coverage,
+             min_angle=args.min_angle, max_views=args.max_views, FOV=args.fov, upper_hemisphere=args.upper_hemisphere)
+    return 0
+
+
+def cmd_postprocess(args):
+    from postprocess import postprocess_dir
+
+    results = postprocess_dir(args.output_dir, args.workers, alpha_threshold=args.alpha_threshold)
+    return 0 if all(result['success'] for result in results) else 1
+
+
+def cmd_export(args):
+    import numpy as np
+    from pose_store import export_json, import_json
+
+    if args.src.endswith(".npz"):
+        export_json(args.src, args.dst)
+    else:
+        import_json(args.src, args.dst, np.float64 if args.float64 else np.float32)
+    return 0
+
+
+def cmd_train(args):
+    from ns_train import run_ns_train_batch
+
+    results = run_ns_train_batch(args.folders, args.devices, args.timeout, args.retries, args.log_dir)
+    return 0 if all(result['status'] == "ok" for result in results) else 1
+
+
+def cmd_eval(args):
+    from evaluation import evaluate_model
+
+    summary = evaluate_model(args.config, args.transforms, args.output, batch_size=args.batch_size,
+                             device=args.device, max_depth=args.max_depth)
+    print(json.dumps(summary, indent=4))
+    return 0
+
+
+def cmd_render_model(args):
+    from render_depth import render_and_save_depth_imgs
+
+    render_and_save_depth_imgs(args.config, args.poses, args.output, batch_size=args.batch_size,
+                               device=args.device, outputs=tuple(args.outputs), report=args.report,
+                               model_space=args.model_space)
+    return 0
+
+
+def cmd_pipeline(args):
+    from pipeline import BLENDER_COMMAND, run_pipeline
+
+    blender = [args.blender] + BLENDER_COMMAND[1:] if args.blender else BLENDER_COMMAND
+    results = run_pipeline(args.mesh_dir, args.work_dir, args.params, args.devices, args.num_meshes,
+                           args.stages, blender, args.force)
+    return 0 if all(r['status'] != "failed" for report in results.values() for r in report.values()) else 1
+
+
+def cmd_bench(args):
+    from bench import BASELINE_PATH, check, run
+
+    results = run(args.sizes, args.only, args.repeats)
+    return check(results, args.baseline or BASELINE_PATH, args.tolerance, args.update_baseline)
+
+
+def build_parser():
+    stages = ("render", "export", "train", "evaluate")
+
+    parser = argparse.ArgumentParser(prog="cli.py", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render = subparsers.add_parser("render", help="render meshes with Blender")
+    render.add_argument("mesh_dir")
+    render.add_argument("output")
+    render.add_argument("--stl", nargs="+", default=None, help="render these STLs instead of all of mesh_dir")
+    render.add_argument("--rot-res", type=int, default=4)
+    render.add_argument("--fov", type=float, default=90)
+    render.add_argument("--max-faces", type=int, default=None)
+    render.add_argument("--sampler", default="grid")
+    render.add_argument("--sampler-kwargs", type=json.loads, default=None)
+    render.add_argument("--transparent", action="store_true")
+    render.add_argument("--passes", action="store_true", help="also write depth, normal and mask passes")
+    render.add_argument("--pose-file", default=None, help="e.g. outputs/{mesh}/planned_poses.npz from `cli.py plan`")
+    render.add_argument("--blender", default=None, help="blender executable")
+    render.set_defaults(fn=cmd_render)
+
+    plan = subparsers.add_parser("plan", help="pick views by surface coverage, for render --pose-file")
+    plan.add_argument("mesh_dir")
+    plan.add_argument("output_dir")
+    plan.add_argument("--candidates", type=int, default=512)
+    plan.add_argument("--coverage", type=float, default=0.95)
+    plan.add_argument("--min-angle", type=float, default=10)
+    plan.add_argument("--max-views", type=int, default=None)
+    plan.add_argument("--fov", type=float, default=90)
+    plan.add_argument("--upper-hemisphere", action="store_true")
+    plan.set_defaults(fn=cmd_plan)
+
+    postprocess = subparsers.add_parser("postprocess", help="masks, bboxes and aabb_scale for rendered meshes")
+    postprocess.add_argument("output_dir")
+    postprocess.add_argument("--workers", type=int, default=4)
+    postprocess.add_argument("--alpha-threshold", type=int, default=128)
+    postprocess.set_defaults(fn=cmd_postprocess)
+
+    export = subparsers.add_parser("export", help="convert between transforms.json and a pose store .npz")
+    export.add_argument("src")
+    export.add_argument("dst")
+    export.add_argument("--float64", action="store_true")
+    export.set_defaults(fn=cmd_export)
+
+    train = subparsers.add_parser("train", help="ns-train one model per dataset folder")
+    train.add_argument("folders", nargs="+")
+    train.add_argument("--devices", nargs="+", default=["0"])
+    train.add_argument("--timeout", type=float, default=None)
+    train.add_argument("--retries", type=int, default=1)
+    train.add_argument("--log-dir", default="job_logs")
+    train.set_defaults(fn=cmd_train)
+
+    evaluate = subparsers.add_parser("eval", help="PSNR / SSIM / depth error of a trained model vs. its renders")
+    evaluate.add_argument("config")
+    evaluate.add_argument("transforms", help="the mesh's transforms.json (or pose store .npz)")
+    evaluate.add_argument("output")
+    evaluate.add_argument("--batch-size", type=int, default=16)
+    evaluate.add_argument("--device", default=None)
+    evaluate.add_argument("--max-depth", type=float, default=None)
+    evaluate.set_defaults(fn=cmd_eval)
+
+    render_model = subparsers.add_parser("render-model", help="render a trained model at the poses in a pose file")
+    render_model.add_argument("config")
+    render_model.add_argument("poses", help="transforms.json or pose store .npz")
+    render_model.add_argument("output")
+    render_model.add_argument("--batch-size", type=int, default=16)
+    render_model.add_argument("--device", default=None)
+    render_model.add_argument("--outputs", nargs="+", default=["rgb", "depth", "accumulation"])
+    render_model.add_argument("--report", default=None)
+    render_model.add_argument("--model-space", action="store_true",
+                              help="poses are already in the model's normalized space, e.g. test_poses.json")
+    render_model.set_defaults(fn=cmd_render_model)
+
+    pipeline = subparsers.add_parser("pipeline", help="render -> export -> train -> evaluate, skipping current stages")
+    pipeline.add_argument("mesh_dir")
+    pipeline.add_argument("work_dir")
+    pipeline.add_argument("--devices", nargs="+", default=["0"])
+    pipeline.add_argument("--num-meshes", type=int, default=None)
+    pipeline.add_argument("--stages", nargs="+", default=list(stages), choices=stages)
+    pipeline.add_argument("--force", nargs="+", default=[], choices=stages)
+    pipeline.add_argument("--params", type=json.loads, default=None, help="JSON per-stage overrides")
+    pipeline.add_argument("--blender", default=None)
+    pipeline.set_defaults(fn=cmd_pipeline)
+
+    bench = subparsers.add_parser("bench", help="pose / intrinsics / JSON export benchmarks")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    bench.add_argument("--only", nargs="+", default=None)
+    bench.add_argument("--repeats", type=int, default=3)
+    bench.add_argument("--baseline", default=None, help="defaults to bench_baselines.json next to bench.py")
+    bench.add_argument("--update-baseline", action="store_true")
+    bench.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. baseline, 0.25 = 25%%")
+    bench.set_defaults(fn=cmd_bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.fn(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
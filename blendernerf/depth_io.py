@@ -0,0 +1,136 @@
+"""
+Compact storage for depth / accumulation maps.
+
+Two per-frame formats are supported:
+    npy16: float16 .npy, values stored as-is
+    png16: 16-bit PNG, value = round(x * scale), scale recorded in depth_meta.json
+
+A directory of per-frame maps can be packed once into a single (N, H, W)
+float16 {prefix}_stack.npy, which load_depth_dir then memory-maps, so
+training can index tens of thousands of frames without reading them all.
+"""
+import os
+import re
+import json
+import numpy as np
+
+META_NAME = "depth_meta.json"
+
+# depth in scene units * 1000, so png16 covers 0 - 65.535 units at 1e-3 resolution
+DEPTH_PNG_SCALE = 1000.0
+# accumulation lives in [0, 1]
+ACCUMULATION_PNG_SCALE = 65535.0
+
+PNG_SCALES = {"depth": DEPTH_PNG_SCALE, "accumulation": ACCUMULATION_PNG_SCALE}
+
+
+def _squeeze(x):
+    x = np.asarray(x)
+    if x.ndim == 3 and x.shape[-1] == 1:
+        x = x[..., 0]
+    return x
+
+
+def write_npy16(path, x):
+    np.save(path, _squeeze(x).astype(np.float16))
+
+
+def write_png16(path, x, scale: float = DEPTH_PNG_SCALE):
+    from PIL import Image
+
+    x = _squeeze(x).astype(np.float32)
+    encoded = np.clip(np.round(x * scale), 0, 65535).astype(np.uint16)
+    Image.fromarray(encoded).save(path)
+
+
+def read_png16(path, scale: float = DEPTH_PNG_SCALE):
+    from PIL import Image
+
+    return np.asarray(Image.open(path), dtype=np.float32) / scale
+
+
+def save_meta(output_dir, prefix: str, fmt: str, scale: float = None):
+    """
+    Records how {prefix}_*.{ext} in output_dir were encoded, so readers don't
+    have to guess the png16 scale.
+    """
+    meta_path = os.path.join(output_dir, META_NAME)
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+
+    meta[prefix] = {"format": fmt, "scale": scale}
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file, indent=4)
+
+
+def load_meta(output_dir):
+    meta_path = os.path.join(output_dir, META_NAME)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, 'r') as file:
+        return json.load(file)
+
+
+def list_frames(output_dir, prefix: str):
+    """
+    {prefix}_{i}.npy / .png files in output_dir, sorted by frame index i
+    """
+    pattern = re.compile(rf"^{re.escape(prefix)}_(\d+)\.(npy|png)$")
+    frames = []
+    for fname in os.listdir(output_dir):
+        match = pattern.match(fname)
+        if match:
+            frames.append((int(match.group(1)), os.path.join(output_dir, fname)))
+    return [path for _, path in sorted(frames)]
+
+
+def read_frame(path, scale: float = None):
+    if path.endswith(".npy"):
+        return np.load(path)
+    return read_png16(path, scale or DEPTH_PNG_SCALE)
+
+
+def pack_depth_dir(output_dir, prefix: str = "depth"):
+    """
+    Packs every {prefix}_{i} frame into one float16 {prefix}_stack.npy, written
+    frame by frame through a memmap so the whole set is never in memory.
+    """
+    frames = list_frames(output_dir, prefix)
+    if not frames:
+        raise FileNotFoundError(f"no {prefix}_*.npy/png frames in {output_dir}")
+
+    scale = load_meta(output_dir).get(prefix, {}).get("scale") or PNG_SCALES.get(prefix, DEPTH_PNG_SCALE)
+
+    first = read_frame(frames[0], scale)
+    stack_path = os.path.join(output_dir, f"{prefix}_stack.npy")
+    stack = np.lib.format.open_memmap(stack_path, mode='w+', dtype=np.float16,
+                                      shape=(len(frames),) + _squeeze(first).shape)
+
+    for i, path in enumerate(frames):
+        stack[i] = _squeeze(read_frame(path, scale))
+
+    stack.flush()
+    del stack
+
+    return stack_path
+
+
+def load_depth_dir(output_dir, prefix: str = "depth", repack: bool = False):
+    """
+    Returns a read-only memory-mapped (N, H, W) float16 array of every
+    {prefix}_{i} frame in output_dir, packing the directory first if needed.
+    """
+    stack_path = os.path.join(output_dir, f"{prefix}_stack.npy")
+    if repack or not os.path.exists(stack_path):
+        pack_depth_dir(output_dir, prefix)
+
+    stack = np.load(stack_path, mmap_mode='r')
+    # frames were added since the last pack
+    if len(stack) != len(list_frames(output_dir, prefix)):
+        del stack
+        pack_depth_dir(output_dir, prefix)
+        stack = np.load(stack_path, mmap_mode='r')
+
+    return stack
@@ -0,0 +1,322 @@
+"""
+Image-quality evaluation of a trained model against the Blender ground truth.
+
+Model renders are paired with the frames of the mesh's transforms.json and
+scored a chunk of frames at a time: PSNR and SSIM on RGB, plus depth error
+(abs rel, RMSE, MAE) where a frame has a depth_file_path. Every metric is
+computed over the whole (B, H, W, C) chunk at once, so memory stays at one
+chunk and there's no per-frame or per-pixel Python loop.
+
+Writes {output_dir}/eval_frames.csv (one row per frame) and
+{output_dir}/eval_summary.json (means over the mesh).
+
+    python evaluation.py outputs/bunny/splatfacto/<run>/config.yml outputs/bunny/transforms.json evals/bunny
+"""
+import os
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from depth_io import read_frame
+
+SSIM_WINDOW = 11
+SSIM_SIGMA = 1.5
+SSIM_C1 = 0.01 ** 2
+SSIM_C2 = 0.03 ** 2
+
+
+def psnr(pred, gt):
+    """
+    pred, gt: (B, H, W, C) in [0, 1], returns (B,)
+    """
+    mse = np.mean((pred - gt) ** 2, axis=(1, 2, 3))
+    return -10 * np.log10(np.maximum(mse, 1e-10))
+
+
+def _gaussian_kernel(size: int = SSIM_WINDOW, sigma: float = SSIM_SIGMA):
+    x = np.arange(size) - (size - 1) / 2
+    kernel = np.exp(-x ** 2 / (2 * sigma ** 2))
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def _blur(x, kernel):
+    """
+    Separable 'valid' Gaussian filter over the H and W axes of (B, H, W, C)
+    """
+    for axis in (1, 2):
+        windows = np.lib.stride_tricks.sliding_window_view(x, len(kernel), axis=axis)
+        x = windows @ kernel
+    return x
+
+
+def ssim(pred, gt):
+    """
+    Gaussian-window SSIM (Wang et al. 2004), pred, gt: (B, H, W, C) in [0, 1], returns (B,)
+    """
+    kernel = _gaussian_kernel()
+    mu_p, mu_g = _blur(pred, kernel), _blur(gt, kernel)
+    var_p = _blur(pred * pred, kernel) - mu_p ** 2
+    var_g = _blur(gt * gt, kernel) - mu_g ** 2
+    cov = _blur(pred * gt, kernel) - mu_p * mu_g
+
+    ssim_map = ((2 * mu_p * mu_g + SSIM_C1) * (2 * cov + SSIM_C2)
+                / ((mu_p ** 2 + mu_g ** 2 + SSIM_C1) * (var_p + var_g + SSIM_C2)))
+    return ssim_map.mean(axis=(1, 2, 3))
+
+
+def ssim_torch(pred, gt):
+    """
+    ssim on (B, H, W, C) torch tensors, on whatever device they are on
+    (same result as ssim, a GPU scores a chunk in milliseconds)
+    """
+    import torch
+    import torch.nn.functional as F
+
+    channels = pred.shape[-1]
+    kernel = torch.from_numpy(_gaussian_kernel()).to(pred)
+    kernel_h = kernel.view(1, 1, -1, 1).repeat(channels, 1, 1, 1)
+    kernel_w = kernel.view(1, 1, 1, -1).repeat(channels, 1, 1, 1)
+
+    def blur(x):
+        x = F.conv2d(x, kernel_h, groups=channels)
+        return F.conv2d(x, kernel_w, groups=channels)
+
+    pred, gt = pred.permute(0, 3, 1, 2), gt.permute(0, 3, 1, 2)
+    mu_p, mu_g = blur(pred), blur(gt)
+    var_p = blur(pred * pred) - mu_p ** 2
+    var_g = blur(gt * gt) - mu_g ** 2
+    cov = blur(pred * gt) - mu_p * mu_g
+
+    ssim_map = ((2 * mu_p * mu_g + SSIM_C1) * (2 * cov + SSIM_C2)
+                / ((mu_p ** 2 + mu_g ** 2 + SSIM_C1) * (var_p + var_g + SSIM_C2)))
+    return ssim_map.mean(dim=(1, 2, 3))
+
+
+def depth_errors(pred, gt, max_depth: float = None):
+    """
+    pred, gt: (B, H, W) depth, pixels where gt isn't a finite positive depth
+    (background, or beyond max_depth) are ignored.
+    returns {name: (B,)}, NaN for frames without a valid pixel
+    """
+    valid = np.isfinite(gt) & (gt > 0)
+    if max_depth is not None:
+        valid &= gt <= max_depth
+
+    count = valid.sum(axis=(1, 2))
+    safe_gt = np.where(valid, gt, 1)
+    diff = np.where(valid, pred - gt, 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'depth_abs_rel': np.sum(np.abs(diff) / safe_gt, axis=(1, 2)) / count,
+            'depth_rmse': np.sqrt(np.sum(diff ** 2, axis=(1, 2)) / count),
+            'depth_mae': np.sum(np.abs(diff), axis=(1, 2)) / count,
+            'depth_valid': count / valid[0].size,
+        }
+
+
+def load_rgb(path, background=(0, 0, 0)):
+    """
+    (H, W, 3) float32 in [0, 1], RGBA composited over background
+    """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        x = np.asarray(img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB"), dtype=np.float32) / 255
+    if x.shape[-1] == 4:
+        x = x[..., :3] * x[..., 3:] + np.asarray(background, dtype=np.float32) * (1 - x[..., 3:])
+    return x
+
+
+def load_mask(path, threshold: int = 128):
+    """
+    (H, W) bool from an 8 bit mask image (a mask pass or postprocess.py)
+    """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return np.asarray(img.convert("L")) >= threshold
+
+
+def load_depth(path):
+    """
+    (H, W) float32 depth from .npy / .png16 (depth_io) or .exr (e.g. a Blender Z pass)
+    """
+    if path.endswith(".exr"):
+        os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+        import cv2
+
+        x = cv2.imread(path, cv2.IMREAD_ANYCOLOR | cv2.IMREAD_ANYDEPTH)
+        if x is None:
+            raise FileNotFoundError(path)
+        return (x[..., 0] if x.ndim == 3 else x).astype(np.float32)
+    x = read_frame(path)
+    return (x[..., 0] if x.ndim == 3 else x).astype(np.float32)
+
+
+def score_chunk(pred_rgb, gt_rgb, pred_depth=None, gt_depth=None, max_depth: float = None, device=None):
+    """
+    Metrics for one chunk, returns {name: (B,)}
+    device: a torch device to compute PSNR / SSIM on instead of NumPy
+    """
+    if device is None:
+        metrics = {'psnr': psnr(pred_rgb, gt_rgb), 'ssim': ssim(pred_rgb, gt_rgb)}
+    else:
+        import torch
+
+        pred, gt = torch.as_tensor(pred_rgb, device=device), torch.as_tensor(gt_rgb, device=device)
+        mse = ((pred - gt) ** 2).mean(dim=(1, 2, 3)).clamp_min(1e-10)
+        metrics = {'psnr': (-10 * torch.log10(mse)).cpu().numpy(), 'ssim': ssim_torch(pred, gt).cpu().numpy()}
+    if pred_depth is not None and gt_depth is not None:
+        metrics.update(depth_errors(pred_depth, gt_depth, max_depth))
+    return metrics
+
+
+class EvalReport:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, names, metrics: dict):
+        for i, name in enumerate(names):
+            self.rows.append({'frame': name, **{k: float(v[i]) for k, v in metrics.items()}})
+
+    def summary(self):
+        keys = sorted({k for row in self.rows for k in row if k != 'frame'})
+        summary = {'num_frames': len(self.rows)}
+        for key in keys:
+            values = np.array([row.get(key, np.nan) for row in self.rows], dtype=np.float64)
+            summary[key] = float(np.nanmean(values)) if np.isfinite(values).any() else None
+        return summary
+
+    def write(self, output_dir: str):
+        os.makedirs(output_dir, exist_ok=True)
+        fields = ['frame'] + sorted({k for row in self.rows for k in row if k != 'frame'})
+        with open(os.path.join(output_dir, "eval_frames.csv"), 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+        summary = self.summary()
+        with open(os.path.join(output_dir, "eval_summary.json"), 'w') as file:
+            json.dump(summary, file, indent=4)
+        return summary
+
+
+def _load_gt_chunk(mesh_dir, frames, background, pool):
+    rgb = np.stack(list(pool.map(lambda f: load_rgb(os.path.join(mesh_dir, f["file_path"]), background), frames)))
+    if all("depth_file_path" in f for f in frames):
+        depth = np.stack(list(pool.map(lambda f: load_depth(os.path.join(mesh_dir, f["depth_file_path"])), frames)))
+        # only score depth on the object, the background depth is whatever was behind it
+        if all("mask_path" in f for f in frames):
+            mask = np.stack(list(pool.map(lambda f: load_mask(os.path.join(mesh_dir, f["mask_path"])), frames)))
+            depth[~mask] = np.nan
+    else:
+        depth = None
+    return rgb, depth
+
+
+def _frame_name(frame):
+    return os.path.splitext(os.path.basename(frame["file_path"]))[0]
+
+
+def evaluate_model(config: str, transforms_path: str, output_dir: str, batch_size: int = 16, device: str = None,
+                   background=(0, 0, 0), max_depth: float = None, num_threads: int = 8):
+    """
+    Renders the trained model in config at every pose of transforms_path
+    (render_dir's world space) and scores it against the images listed there.
+    Model depth is scaled back to world units before comparing.
+    returns the per-mesh summary dict
+    """
+    import torch
+    from novel_views import NovelViewRenderer
+    from pose_store import load_transforms
+    from render_depth import render_cameras
+
+    transforms = load_transforms(transforms_path)
+    frames = transforms["frames"]
+    mesh_dir = os.path.dirname(os.path.abspath(transforms_path))
+
+    renderer = NovelViewRenderer(config, device)
+    cameras = renderer.cameras(transforms)
+    depth_scale = float(renderer.pipeline.datamanager.train_dataparser_outputs.dataparser_scale)
+    with_depth = all("depth_file_path" in f for f in frames)
+    output_names = ("rgb", "depth") if with_depth else ("rgb",)
+
+    report = EvalReport()
+    start = time.perf_counter()
+    renders = render_cameras(renderer.pipeline, cameras, output_names, batch_size)
+    with ThreadPoolExecutor(num_threads) as pool:
+        for chunk_start in range(0, len(frames), batch_size):
+            chunk = frames[chunk_start:chunk_start + batch_size]
+            outputs = [next(renders) for _ in chunk]
+
+            pred_rgb = torch.stack([o["rgb"] for o in outputs]).clamp(0, 1).numpy().astype(np.float32)
+            pred_depth = (torch.stack([o["depth"] for o in outputs])[..., 0].numpy() / depth_scale) if with_depth else None
+            gt_rgb, gt_depth = _load_gt_chunk(mesh_dir, chunk, background, pool)
+
+            report.add([_frame_name(f) for f in chunk],
+                       score_chunk(pred_rgb, gt_rgb, pred_depth, gt_depth, max_depth, renderer.pipeline.device))
+
+    summary = report.write(output_dir)
+    print(f"scored {len(frames)} frames in {time.perf_counter() - start:.2f}s: "
+          f"PSNR {summary['psnr']:.2f}, SSIM {summary['ssim']:.4f}")
+    return summary
+
+
+def evaluate_dir(pred_dir: str, transforms_path: str, output_dir: str = None, batch_size: int = 32,
+                 depth_scale: float = 1.0, background=(0, 0, 0), max_depth: float = None, num_threads: int = 8,
+                 device=None):
+    """
+    Scores renders already on disk, img_{i}.png (+ depth_{i}) as written by
+    render_depth.render_and_save_depth_imgs, frame i matching frame i of transforms_path.
+    The renders must be of transforms_path's world space poses mapped into the
+    model's space, i.e. render_and_save_depth_imgs(config, transforms_path, ...)
+    with the default model_space=False (or NovelViewRenderer.render without it).
+    depth_scale: the model's dataparser_scale, rendered depth is divided by it
+    device: torch device for PSNR / SSIM, see score_chunk
+    """
+    from depth_io import list_frames, load_meta, PNG_SCALES
+    from pose_store import load_transforms
+
+    frames = load_transforms(transforms_path)["frames"]
+    mesh_dir = os.path.dirname(os.path.abspath(transforms_path))
+    output_dir = output_dir or pred_dir
+
+    depth_paths = list_frames(pred_dir, "depth")
+    with_depth = len(depth_paths) == len(frames) and all("depth_file_path" in f for f in frames)
+    depth_png_scale = load_meta(pred_dir).get("depth", {}).get("scale") or PNG_SCALES["depth"]
+
+    report = EvalReport()
+    with ThreadPoolExecutor(num_threads) as pool:
+        for chunk_start in range(0, len(frames), batch_size):
+            chunk = frames[chunk_start:chunk_start + batch_size]
+            indices = range(chunk_start, chunk_start + len(chunk))
+
+            pred_rgb = np.stack(list(pool.map(lambda i: load_rgb(os.path.join(pred_dir, f"img_{i}.png")), indices)))
+            gt_rgb, gt_depth = _load_gt_chunk(mesh_dir, chunk, background, pool)
+            pred_depth = None
+            if with_depth:
+                pred_depth = np.stack([read_frame(depth_paths[i], depth_png_scale).astype(np.float32)
+                                       for i in indices]) / depth_scale
+
+            report.add([_frame_name(f) for f in chunk],
+                       score_chunk(pred_rgb, gt_rgb, pred_depth, gt_depth if with_depth else None, max_depth, device))
+
+    return report.write(output_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("config")
+    parser.add_argument("transforms")
+    parser.add_argument("output_dir")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--device", default=None)
+    args = parser.parse_args()
+
+    print(json.dumps(evaluate_model(args.config, args.transforms, args.output_dir, args.batch_size, args.device), indent=4))
@@ -3,10 +3,12 @@ based on blendernerf
 """
 import os
 import json
-from scene_utils import get_rot_matrix
-import numpy as np
 
-def get_camera_intrinsics(scene, camera):
+def get_camera_intrinsics(scene, camera, downscale=1):
+        """
+        downscale: intrinsics for the render downsampled by this factor (e.g. images_2),
+            whose size is floored to whole pixels like pyramid.downsample_image does
+        """
         camera_angle_x = camera.data.angle_x
         camera_angle_y = camera.data.angle_y
 
@@ -67,6 +69,14 @@ def get_camera_intrinsics(scene, camera):
             'h': height_res_in_px,
             #'aabb_scale': scene.aabb
         }
+
+        if downscale != 1:
+            # a non-dividing factor crops nothing, the whole frame is resampled
+            # into the floored size, so each axis scales by its own ratio
+            w, h = int(width_res_in_px) // downscale, int(height_res_in_px) // downscale
+            ratio_x, ratio_y = w / width_res_in_px, h / height_res_in_px
+            camera_intr_dict.update(fl_x=s_u * ratio_x, fl_y=s_v * ratio_y, cx=optical_center_x * ratio_x,
+                                    cy=optical_center_y * ratio_y, w=w, h=h)
         return camera_intr_dict
 
 def get_camera_extrinsics(scene, camera, name, mode='TRAIN'):
@@ -82,24 +92,103 @@ def get_camera_extrinsics(scene, camera, name, mode='TRAIN'):
 
     return frame_data
 
+def _indent(text, spaces):
+    pad = " " * spaces
+    return "\n".join(pad + line for line in text.splitlines())
+
 def add_to_json_file(filename, data, wipe=False):
+    """
+    Appends data to the JSON array in filename without re-reading it: only the
+    closing bracket is rewritten, so each append costs the same whatever the file size.
+    """
     if os.path.exists(filename) and not wipe:
-        with open(filename, 'r+') as file:
-            # Load existing JSON data
-            json_data = json.load(file)
-            # Append new data to the JSON
-            json_data.append(data)
-            # Move the file cursor to the beginning to overwrite the file
-            file.seek(0)
-            # Write the updated JSON data
-            json.dump(json_data, file, indent=4)
-            file.truncate()  # Truncate any remaining content if the new data is smaller
+        with open(filename, 'rb+') as file:
+            # find the closing bracket, skipping trailing whitespace
+            file.seek(0, os.SEEK_END)
+            pos = file.tell()
+            last = b""
+            while pos > 0:
+                pos -= 1
+                file.seek(pos)
+                last = file.read(1)
+                if not last.isspace():
+                    break
+            if last != b"]":
+                raise ValueError(f"{filename} does not end in a JSON array")
+            close_pos = pos
+
+            # is the array empty? look at the previous non-whitespace byte
+            while pos > 0:
+                pos -= 1
+                file.seek(pos)
+                prev = file.read(1)
+                if not prev.isspace():
+                    break
+
+            separator = "\n" if prev == b"[" else ",\n"
+            file.seek(close_pos)
+            file.write((separator + _indent(json.dumps(data, indent=4), 4) + "\n]").encode())
+            file.truncate()
     else:
         if os.path.exists(filename):
             os.remove(filename)
         with open(filename, 'w') as file:
             json.dump([data], file, indent=4)
 
+class TransformsWriter:
+    """
+    Streams frames into a nerfstudio transforms.json. The file is kept open and
+    only the closing brackets are rewritten after each frame, so appends are
+    constant time and the file on disk is valid JSON after every append, even
+    if the process dies before close().
+    """
+    CLOSING = "\n    ]\n}\n"
+
+    def __init__(self, filename, intrinsics: dict, fsync: bool = False):
+        self.filename = filename
+        self.fsync = fsync
+        self.num_frames = 0
+
+        header = {k: v for k, v in intrinsics.items() if k != 'frames'}
+        if header:
+            body = json.dumps(header, indent=4)
+            prefix = body[:body.rindex('}')].rstrip() + ',\n    "frames": ['
+        else:
+            prefix = '{\n    "frames": ['
+
+        self.file = open(filename, 'w')
+        self.file.write(prefix)
+        self._end = self.file.tell()
+        self._write_closing()
+
+        for frame in intrinsics.get('frames', []):
+            self.append(frame)
+
+    def _write_closing(self):
+        self.file.write(self.CLOSING)
+        self.file.truncate()
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def append(self, frame: dict):
+        separator = "\n" if self.num_frames == 0 else ",\n"
+        self.file.seek(self._end)
+        self.file.write(separator + _indent(json.dumps(frame, indent=4), 8))
+        self._end = self.file.tell()
+        self._write_closing()
+        self.num_frames += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def save_json(data, filename):
     if os.path.exists(filename):
         os.remove(filename)
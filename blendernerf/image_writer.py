@@ -0,0 +1,133 @@
+"""
+Background image writer: rendered frames go into a bounded queue and a pool of
+threads encodes and writes them while rendering continues. Only max_pending
+frames are ever held in memory, however many poses are rendered.
+"""
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+from depth_io import write_npy16, write_png16
+
+
+def to_numpy(img):
+    if hasattr(img, "detach"):
+        img = img.detach().cpu().numpy()
+    return np.asarray(img)
+
+
+def write_png(path, img):
+    from PIL import Image
+
+    if img.dtype != np.uint8 and img.dtype != np.uint16:
+        img = (np.clip(img, 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+    if img.ndim == 3 and img.shape[-1] == 1:
+        img = img[..., 0]
+
+    Image.fromarray(img).save(path, compress_level=1)
+
+
+def write_exr(path, img):
+    # opencv only reads/writes EXR when this is set before import
+    os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+    import cv2
+
+    img = img.astype(np.float32)
+    if img.ndim == 3 and img.shape[-1] >= 3:
+        img = img[..., [2, 1, 0]]  # opencv expects BGR
+    cv2.imwrite(path, img)
+
+
+def write_npy(path, img):
+    np.save(path, img)
+
+
+# format -> (file extension, writer)
+WRITERS = {
+    "png": ("png", write_png),
+    "exr": ("exr", write_exr),
+    "npy": ("npy", write_npy),
+    "npy16": ("npy", write_npy16),
+    "png16": ("png", write_png16),
+}
+
+
+class ImageWriter:
+    """
+    Usage:
+        with ImageWriter(output_dir, fmt="png") as writer:
+            for i, img in enumerate(imgs):
+                writer.put(f"img_{i}", img)
+
+    put() blocks once max_pending frames are waiting, which keeps memory
+    bounded when rendering outpaces encoding.
+    """
+    def __init__(self, output_dir: str, fmt: str = "png", num_threads: int = 4, max_pending: int = 8,
+                 profiler=None):
+        """
+        profiler: optional profiling.RenderProfiler, gets one "encode" record per image
+        """
+        if fmt not in WRITERS:
+            raise ValueError(f"fmt must be one of {list(WRITERS)}, got {fmt}")
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.profiler = profiler
+        self.num_written = 0
+        self.errors = []
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(num_threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            path, img, fmt, kwargs = item
+            start = time.perf_counter()
+            try:
+                WRITERS[fmt][1](path, to_numpy(img), **kwargs)
+                if self.profiler is not None:
+                    self.profiler.add("encode", time.perf_counter() - start, frame=os.path.basename(path))
+                with self._lock:
+                    self.num_written += 1
+            except Exception as e:
+                with self._lock:
+                    self.errors.append((path, e))
+            finally:
+                self._queue.task_done()
+
+    def put(self, name: str, img, fmt=None, **kwargs):
+        """
+        Queues img to be written to {output_dir}/{name}.{ext}, returns the path.
+        kwargs go to the format's writer, e.g. scale for png16.
+        """
+        fmt = fmt or self.fmt
+        path = os.path.join(self.output_dir, f"{name}.{WRITERS[fmt][0]}")
+        self._queue.put((path, img, fmt, kwargs))
+        return path
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        if self.errors:
+            path, e = self.errors[0]
+            raise RuntimeError(f"failed to write {len(self.errors)} images, first {path}") from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
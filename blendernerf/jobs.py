@@ -0,0 +1,175 @@
+"""
+Headless subprocess job runner with a device pool.
+
+Each job is a command run with CUDA_VISIBLE_DEVICES set to the device slot
+it was given (a None slot leaves the inherited environment alone). Jobs run concurrently, one per slot, their output is streamed
+to a per-job log file, and failed or timed out jobs are retried.
+
+    results = run_jobs(
+        [Job("bunny", ["ns-train", "splatfacto", "--data", "outputs/bunny"])],
+        devices=["0", "1", "cpu"],
+    )
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import threading
+import subprocess
+from collections import Counter
+
+CPU = "cpu"
+
+
+class Job:
+    def __init__(self, name: str, command, timeout: float = None, retries: int = 0, env: dict = None):
+        """
+        command: argument list, or a callable (device) -> argument list for
+            commands that depend on the slot they land on
+        timeout: seconds per attempt, None for no limit
+        retries: extra attempts after a failure or timeout
+        """
+        self.name = name
+        self.command = command
+        self.timeout = timeout
+        self.retries = retries
+        self.env = env or {}
+
+    def build_command(self, device: str):
+        if callable(self.command):
+            return list(self.command(device))
+        # only the placeholder is substituted, other braces (e.g. JSON arguments) pass through as-is
+        return [str(arg).replace("{device}", str(device)) for arg in self.command]
+
+
+def _stream(pipe, log_file, prefix, echo):
+    for line in iter(pipe.readline, ""):
+        log_file.write(line)
+        log_file.flush()
+        if echo:
+            sys.stdout.write(f"{prefix}{line}")
+    pipe.close()
+
+
+def run_job(job: Job, device: str, log_path: str, echo: bool = False):
+    """
+    Runs job on device until it succeeds or runs out of retries.
+    returns a result dict with status ("ok", "failed", "timeout"), attempts and timings
+    """
+    env = dict(os.environ, **job.env)
+    # an empty CUDA_VISIBLE_DEVICES hides every GPU from cpu slots
+    if device is not None:
+        env["CUDA_VISIBLE_DEVICES"] = "" if device == CPU else str(device)
+
+    attempts = []
+    start = time.perf_counter()
+    with open(log_path, 'a') as log_file:
+        for attempt in range(job.retries + 1):
+            command = job.build_command(device)
+            log_file.write(f"=== attempt {attempt + 1} on device {device}: {' '.join(command)}\n")
+            log_file.flush()
+
+            attempt_start = time.perf_counter()
+            # own process group, so a timeout also kills what a wrapper (conda run) started
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, env=env, start_new_session=True)
+            reader = threading.Thread(target=_stream, args=(process.stdout, log_file, f"[{job.name}] ", echo))
+            reader.start()
+
+            try:
+                returncode = process.wait(timeout=job.timeout)
+                status = "ok" if returncode == 0 else "failed"
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                returncode = process.wait()
+                status = "timeout"
+            reader.join()
+
+            attempts.append({'status': status, 'returncode': returncode,
+                             'seconds': time.perf_counter() - attempt_start})
+            if status == "ok":
+                break
+
+    return {
+        'name': job.name,
+        'status': attempts[-1]['status'],
+        'device': device,
+        'attempts': attempts,
+        'wall_seconds': time.perf_counter() - start,
+        'log': log_path,
+    }
+
+
+def visible_gpus(num_slots: int):
+    """
+    num_slots device slots spread round-robin over this process's
+    CUDA_VISIBLE_DEVICES, or None slots (inherit the environment) if it isn't set
+    """
+    visible = [d.strip() for d in os.environ.get("CUDA_VISIBLE_DEVICES", "").split(",") if d.strip()]
+    if not visible:
+        return [None] * num_slots
+    return [visible[i % len(visible)] for i in range(num_slots)]
+
+
+def _log_names(jobs):
+    """
+    job names, with _1, _2, ... appended to names used by more than one job
+    """
+    counts, seen = Counter(job.name for job in jobs), Counter()
+    names = []
+    for job in jobs:
+        seen[job.name] += 1
+        names.append(job.name if counts[job.name] == 1 else f"{job.name}_{seen[job.name]}")
+    return names
+
+
+def run_jobs(jobs, devices=("0",), log_dir: str = "job_logs", echo: bool = False):
+    """
+    Runs jobs concurrently, at most one per entry in devices (repeat an entry
+    to run several jobs on the same device, use "cpu" for CPU-only slots and
+    None to keep the inherited CUDA_VISIBLE_DEVICES).
+    Writes {log_dir}/{job name}.log per job (suffixed _1, _2, ... for repeated names) and {log_dir}/jobs_report.json.
+    returns result dicts in the same order as jobs
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    log_names = _log_names(jobs)
+
+    pending = queue.Queue()
+    for i, job in enumerate(jobs):
+        pending.put((i, job))
+
+    results = [None] * len(jobs)
+
+    def _worker(device):
+        while True:
+            try:
+                i, job = pending.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                result = run_job(job, device, os.path.join(log_dir, f"{log_names[i]}.log"), echo)
+            except Exception as e:  # e.g. command not found
+                result = {'name': job.name, 'status': "failed", 'device': device, 'attempts': [],
+                          'wall_seconds': 0.0, 'log': None, 'error': repr(e)}
+            results[i] = result
+            print(f"[{job.name}] {result['status']} on device {device} after {result['wall_seconds']:.1f}s")
+
+    workers = [threading.Thread(target=_worker, args=(device,)) for device in devices]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with open(os.path.join(log_dir, "jobs_report.json"), 'w') as file:
+        json.dump(results, file, indent=4)
+
+    failed = [r for r in results if r['status'] != "ok"]
+    print(f"{len(results) - len(failed)}/{len(results)} jobs succeeded")
+
+    return results
@@ -0,0 +1,170 @@
+"""
+Per-mesh render manifest so interrupted render_dir runs can resume.
+
+The manifest lives next to the rendered images as manifest.json and records,
+for every finished view, the pose it was rendered with and the size of the
+PNG that was written. A view is only considered done if the STL content,
+the render settings and its pose all still match and the PNG on disk is intact,
+along with its depth / normal / mask pass files when passes were rendered.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+# render_mesh saves the manifest every this many views (and when it stops)
+SAVE_EVERY = 32
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"IEND\xaeB`\x82"
+EXR_MAGIC = b"\x76\x2f\x31\x01"
+
+# transforms.json keys of render pass files, see scene_utils.set_pass_paths
+PASS_KEYS = ("depth_file_path", "depth_exr_path", "normal_path", "mask_path")
+
+
+def file_hash(filename, chunk_size: int = 1 << 20):
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def settings_hash(settings: dict):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def pose_hash(pose):
+    # rounded so float noise between runs doesn't invalidate finished views
+    pose = np.round(np.asarray(pose, dtype=np.float64), 6) + 0.0
+    return hashlib.sha256(pose.tobytes()).hexdigest()[:16]
+
+
+def png_is_complete(filename):
+    """
+    Cheap integrity check: PNG signature at the start and IEND chunk at the end.
+    Catches files truncated by a killed render without decoding them.
+    """
+    try:
+        size = os.path.getsize(filename)
+        if size < len(PNG_SIGNATURE) + len(PNG_IEND):
+            return False
+        with open(filename, 'rb') as file:
+            head = file.read(len(PNG_SIGNATURE))
+            file.seek(-len(PNG_IEND), os.SEEK_END)
+            tail = file.read()
+    except OSError:
+        return False
+
+    return head == PNG_SIGNATURE and tail == PNG_IEND
+
+
+def pass_is_complete(filename, size: int):
+    """
+    A pass file is intact if it has the size recorded after its render and
+    starts with its format's magic (EXR has no end marker to check)
+    """
+    try:
+        if os.path.getsize(filename) != size:
+            return False
+    except OSError:
+        return False
+
+    if filename.endswith(".png"):
+        return png_is_complete(filename)
+    with open(filename, 'rb') as file:
+        return file.read(len(EXR_MAGIC)) == EXR_MAGIC
+
+
+class RenderManifest:
+    def __init__(self, mesh_output_dir: str, stl_hash: str, settings_hash: str):
+        self.path = os.path.join(mesh_output_dir, MANIFEST_NAME)
+        self.mesh_output_dir = mesh_output_dir
+        self.stl_hash = stl_hash
+        self.settings_hash = settings_hash
+        self.intrinsics = None
+        self.views = {}
+
+    @classmethod
+    def load(cls, mesh_output_dir: str, stl_hash: str, settings_hash: str):
+        """
+        Loads the manifest for mesh_output_dir. Views recorded for a different
+        STL or different render settings are dropped, so they get re-rendered.
+        """
+        manifest = cls(mesh_output_dir, stl_hash, settings_hash)
+        if not os.path.exists(manifest.path):
+            return manifest
+
+        try:
+            with open(manifest.path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return manifest
+
+        if data.get('stl_hash') == stl_hash and data.get('settings_hash') == settings_hash:
+            manifest.intrinsics = data.get('intrinsics')
+            manifest.views = data.get('views', {})
+
+        return manifest
+
+    def is_done(self, name: str, pose):
+        view = self.views.get(name)
+        if view is None or view['pose_hash'] != pose_hash(pose):
+            return False
+
+        img_path = os.path.join(self.mesh_output_dir, view['file_path'])
+        if not (png_is_complete(img_path) and os.path.getsize(img_path) == view['size']):
+            return False
+
+        return all(pass_is_complete(os.path.join(self.mesh_output_dir, view[key]), size)
+                   for key, size in view.get('pass_sizes', {}).items())
+
+    def missing(self, c2w, names):
+        return [i for i, (pose, name) in enumerate(zip(c2w, names)) if not self.is_done(name, pose)]
+
+    def record(self, name: str, pose, file_path: str, **extra):
+        """
+        Marks a view finished. file_path is relative to the mesh output dir,
+        extra keys are carried through into its transforms.json frame, the
+        sizes of the pass files among them (PASS_KEYS) are recorded too.
+        """
+        img_path = os.path.join(self.mesh_output_dir, file_path)
+        self.views[name] = {
+            'pose_hash': pose_hash(pose),
+            'file_path': file_path,
+            'size': os.path.getsize(img_path),
+            'pass_sizes': {key: os.path.getsize(os.path.join(self.mesh_output_dir, extra[key]))
+                           for key in PASS_KEYS if key in extra},
+            'transform_matrix': np.asarray(pose).tolist(),
+            **extra,
+        }
+
+    def save(self):
+        os.makedirs(self.mesh_output_dir, exist_ok=True)
+        data = {
+            'stl_hash': self.stl_hash,
+            'settings_hash': self.settings_hash,
+            'intrinsics': self.intrinsics,
+            'views': self.views,
+        }
+        # write-then-rename so a crash never leaves a half written manifest
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.path)
+
+    def transforms(self, names):
+        """
+        Rebuilds the nerfstudio transforms.json dict for the given views, in order.
+        """
+        transforms = dict(self.intrinsics or {})
+        frames = []
+        for name in names:
+            view = self.views[name]
+            frame = {k: v for k, v in view.items() if k not in ('pose_hash', 'size', 'pass_sizes')}
+            frames.append(frame)
+        transforms["frames"] = frames
+
+        return transforms
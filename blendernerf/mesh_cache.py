@@ -0,0 +1,143 @@
+"""
+NumPy STL preprocessing: parse binary/ASCII STL once, weld vertices, center
+and scale to a fixed size, optionally decimate, and cache the result keyed
+by the STL's content hash. Blender then only has to copy the cached arrays
+into a mesh datablock (scene_utils.add_mesh_object).
+"""
+import os
+import re
+import numpy as np
+
+from manifest import file_hash
+
+# max dimension of a normalized mesh, same as the old obj.scale *= 7 / max_dim
+TARGET_SIZE = 7.0
+
+STL_BINARY_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('verts', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+_VERTEX_RE = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+def read_stl(filename):
+    """
+    returns (F, 3, 3) float32 triangle corners
+    """
+    with open(filename, 'rb') as file:
+        data = file.read()
+
+    # the binary header may itself start with "solid", so trust the size check first
+    if len(data) >= 84:
+        num_faces = int(np.frombuffer(data, dtype='<u4', count=1, offset=80)[0])
+        if len(data) == 84 + num_faces * STL_BINARY_DTYPE.itemsize:
+            faces = np.frombuffer(data, dtype=STL_BINARY_DTYPE, count=num_faces, offset=84)
+            return faces['verts'].astype(np.float32)
+
+    if not data.lstrip().startswith(b"solid"):
+        raise ValueError(f"{filename} is neither a binary nor an ASCII STL")
+
+    coords = np.array(_VERTEX_RE.findall(data), dtype=np.float32)
+    if len(coords) % 3:
+        raise ValueError(f"{filename} has {len(coords)} vertices, not a multiple of 3")
+
+    return coords.reshape(-1, 3, 3)
+
+
+def weld(triangles):
+    """
+    Merges identical corners into shared vertices.
+    returns (V, 3) vertices, (F, 3) int32 faces
+    """
+    verts, faces = np.unique(triangles.reshape(-1, 3), axis=0, return_inverse=True)
+    return verts, faces.reshape(-1, 3).astype(np.int32)
+
+
+def normalize(verts, target_size: float = TARGET_SIZE):
+    """
+    Centers the bounding box on the origin and scales the largest dimension to target_size.
+    """
+    lo, hi = verts.min(axis=0), verts.max(axis=0)
+    max_dim = float((hi - lo).max())
+    if max_dim == 0:
+        raise ValueError("mesh has zero extent")
+
+    return ((verts - (lo + hi) / 2) * (target_size / max_dim)).astype(np.float32)
+
+
+def _cluster(verts, faces, resolution: int):
+    lo, hi = verts.min(axis=0), verts.max(axis=0)
+    cell = (hi - lo).max() / resolution
+    keys = np.floor((verts - lo) / cell).astype(np.int64)
+
+    _, cluster, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.ravel()
+
+    # each cluster collapses to the mean of its vertices
+    new_verts = np.zeros((len(counts), 3), dtype=np.float64)
+    np.add.at(new_verts, cluster, verts)
+    new_verts /= counts[:, None]
+
+    new_faces = cluster[faces]
+    keep = ((new_faces[:, 0] != new_faces[:, 1])
+            & (new_faces[:, 1] != new_faces[:, 2])
+            & (new_faces[:, 0] != new_faces[:, 2]))
+    new_faces = new_faces[keep]
+
+    # drop faces that collapsed onto the same three vertices
+    _, unique_idx = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    new_faces = new_faces[np.sort(unique_idx)]
+
+    return new_verts.astype(np.float32), new_faces.astype(np.int32)
+
+
+def decimate(verts, faces, max_faces: int):
+    """
+    Vertex-clustering decimation: snaps vertices to a uniform grid, coarsening
+    the grid until the mesh has at most max_faces faces.
+    """
+    resolution = 512
+    while len(faces) > max_faces and resolution >= 4:
+        new_verts, new_faces = _cluster(verts, faces, resolution)
+        if len(new_faces) <= max_faces:
+            return new_verts, new_faces
+        resolution //= 2
+
+    return verts, faces
+
+
+def preprocess_stl(filename, target_size: float = TARGET_SIZE, max_faces: int = None):
+    verts, faces = weld(read_stl(filename))
+    verts = normalize(verts, target_size)
+    if max_faces is not None and len(faces) > max_faces:
+        verts, faces = decimate(verts, faces, max_faces)
+        # decimation can shrink the bounds slightly
+        verts = normalize(verts, target_size)
+
+    return verts, faces
+
+
+def load_normalized_mesh(filename, cache_dir: str, target_size: float = TARGET_SIZE, max_faces: int = None,
+                         stl_hash: str = None):
+    """
+    Returns (verts, faces) of the preprocessed STL, from cache_dir if this STL
+    was already processed with the same parameters.
+    """
+    stl_hash = stl_hash or file_hash(filename)
+    cache_path = os.path.join(cache_dir, f"{stl_hash}_{target_size:g}_{max_faces or 'full'}.npz")
+
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        return cached['verts'], cached['faces']
+
+    verts, faces = preprocess_stl(filename, target_size, max_faces)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # np.savez appends .npz unless it's already there; write-then-rename so readers never see half a file
+    tmp_path = cache_path[:-len(".npz")] + f".{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, verts=verts, faces=faces)
+    os.replace(tmp_path, cache_path)
+
+    return verts, faces
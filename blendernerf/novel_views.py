@@ -0,0 +1,139 @@
+"""
+In-process novel-view rendering, replacing one ns-render subprocess per pose.
+
+The checkpoint is loaded once and every pose set (a nerfstudio transforms.json,
+a pose store .npz, a nerfstudio viewer camera_path.json, or a generated
+orbit) is rendered in batches to images or straight into a video.
+
+Transforms files and pose stores are taken to be in the Blender world space
+render_dir writes them in, and are mapped into the model's normalized space
+with the dataparser transform and scale, as render_depth does. Pass
+model_space=True for poses already in the model's space, such as
+test_poses.json. Viewer camera paths are always in the model's space.
+
+    renderer = NovelViewRenderer("outputs/bunny/splatfacto/<run>/config.yml")
+    renderer.render("test_poses.json", "renders/test", model_space=True)
+    renderer.render("outputs/bunny/transforms.json", "renders/train_views")
+    renderer.render(orbit_transforms(rot_res=12), "renders/orbit.mp4", video=True)
+"""
+import os
+import math
+from typing import Optional
+
+import numpy as np
+import torch
+
+from render_depth import _cameras_from_transforms, _load_pipeline, render_cameras, to_model_space
+from image_writer import ImageWriter
+from poses import make_frames, orbit_poses
+from pose_store import load_transforms
+
+# intrinsics used for generated orbits when none are given: 512x512, 90 degree FOV like render_dir
+DEFAULT_INTRINSICS = {'fl_x': 256.0, 'fl_y': 256.0, 'cx': 256.0, 'cy': 256.0, 'w': 512, 'h': 512}
+
+
+def camera_path_to_transforms(camera_path: dict):
+    """
+    Converts a nerfstudio viewer camera_path.json (flattened row-major
+    camera_to_world, vertical fov in degrees) to transforms.json layout.
+    """
+    w, h = camera_path["render_width"], camera_path["render_height"]
+    frames = []
+    for camera in camera_path["camera_path"]:
+        focal = h / 2 / math.tan(math.radians(camera["fov"]) / 2)
+        frames.append({
+            'transform_matrix': np.asarray(camera["camera_to_world"], dtype=np.float64).reshape(4, 4).tolist(),
+            'fl_x': focal,
+            'fl_y': focal,
+        })
+
+    return {'cx': w / 2, 'cy': h / 2, 'w': w, 'h': h, 'frames': frames}
+
+
+def load_pose_set(pose_file: str):
+    """
+    returns (transforms dict, True if the poses are already in the model's normalized space)
+    """
+    data = load_transforms(pose_file)
+
+    if "camera_path" in data:
+        # viewer camera paths are recorded in the model's space
+        return camera_path_to_transforms(data), True
+    return data, False
+
+
+def orbit_transforms(rot_res: int = 8, radius: float = math.sqrt(30), intrinsics: Optional[dict] = None):
+    """
+    The render_dir orbit as a transforms dict, in the same world space as the training renders.
+    """
+    c2w, names = orbit_poses(rot_res, radius)
+    return {**(intrinsics or DEFAULT_INTRINSICS), 'frames': make_frames(c2w, names)}
+
+
+class NovelViewRenderer:
+    def __init__(self, config: str, device: Optional[str] = None, pipeline=None):
+        """
+        pipeline: an already loaded pipeline for config, skips loading it again
+        """
+        self.pipeline = pipeline if pipeline is not None else _load_pipeline(config, device)
+
+    def to_model_space(self, transforms: dict):
+        """
+        Applies the dataparser's orientation / scale normalization, so world
+        space poses (e.g. from render_dir) line up with what the model was trained on.
+        """
+        return to_model_space(self.pipeline, transforms)
+
+    def cameras(self, poses, model_space: bool = False):
+        """
+        poses: a pose file path or a transforms dict (world space unless model_space,
+            camera paths are always in model space)
+        """
+        if isinstance(poses, (str, os.PathLike)):
+            transforms, is_camera_path = load_pose_set(str(poses))
+            model_space = model_space or is_camera_path
+        else:
+            transforms = poses
+
+        if not model_space:
+            transforms = self.to_model_space(transforms)
+
+        return _cameras_from_transforms(transforms, self.pipeline.device)
+
+    def render(self, poses, output: str, model_space: bool = False, batch_size: int = 16,
+               output_name: str = "rgb", video: bool = False, fps: int = 24):
+        """
+        Renders every pose to {output}/{i:05d}.png, or to the video file output if video.
+        returns the number of frames rendered
+        """
+        cameras = self.cameras(poses, model_space)
+        frames = (outputs[output_name] for outputs in
+                  render_cameras(self.pipeline, cameras, (output_name,), batch_size))
+
+        num_frames = 0
+        if video:
+            import mediapy
+
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            height, width = int(cameras.height[0]), int(cameras.width[0])
+            with mediapy.VideoWriter(output, shape=(height, width), fps=fps) as writer:
+                for frame in frames:
+                    writer.add_image((frame.clamp(0, 1) * 255).to(torch.uint8).numpy())
+                    num_frames += 1
+        else:
+            with ImageWriter(output, fmt="png", max_pending=2 * batch_size) as writer:
+                for frame in frames:
+                    writer.put(f"{num_frames:05d}", frame)
+                    num_frames += 1
+
+        return num_frames
+
+
+def render_novel_views(config: str, output: str, pose_file: Optional[str] = None, rot_res: Optional[int] = None,
+                       device: Optional[str] = None, **render_kwargs):
+    """
+    Renders pose_file, or a rot_res x rot_res orbit if no pose file is given.
+    """
+    renderer = NovelViewRenderer(config, device)
+    poses = pose_file if pose_file is not None else orbit_transforms(rot_res or 8)
+    return renderer.render(poses, output, **render_kwargs)
@@ -1,28 +1,58 @@
+import os
 import subprocess
 
-def run_ns_train(folder_name, GPU_ID):
-    command = f"conda deactivate && conda init zsh && conda activate ns && CUDA_VISIBLE_DEVICES={GPU_ID} ns-train splatfacto --vis viewer --machine.num-devices 1 --data {folder_name}"
-    try:
-        subprocess.run(command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print("Error running ns-train:", e)
-
-#TODO: write javascript creation code to be compatible with nerfstudio poses
-def run_ns_render(folder_name, GPU_ID):
-    for i, pose in enumerate(poses):
-        # Construct command for ns-render
-        command = [
-            "ns-render",
-            "--scene", scene_file,
-            "--camera_position", ",".join(map(str, pose["position"])),
-            "--camera_orientation", ",".join(map(str, pose["orientation"])),
-            "--output", f"output_{i}.png"  # Output file name
-        ]
-
-        # Execute ns-render
-        subprocess.run(command)
-
-    print("Rendering complete.")
+from jobs import CPU, Job, run_jobs
+
+# ns-train lives in its own conda env; --vis tensorboard so the process exits when training finishes
+NS_TRAIN_COMMAND = ["conda", "run", "--no-capture-output", "-n", "ns",
+                    "ns-train", "splatfacto", "--vis", "tensorboard", "--machine.num-devices", "1"]
+
+
+def ns_train_command(folder_name, device, base_command=NS_TRAIN_COMMAND):
+    command = list(base_command)
+    if device == CPU:
+        command += ["--machine.device-type", "cpu"]
+    return command + ["--data", str(folder_name)]
+
+
+def run_ns_train(folder_name, GPU_ID, log_dir="job_logs"):
+    result = run_jobs([Job(os.path.basename(os.path.normpath(folder_name)),
+                           lambda device: ns_train_command(folder_name, device))],
+                      devices=[str(GPU_ID)], log_dir=log_dir, echo=True)[0]
+    if result['status'] != "ok":
+        raise subprocess.CalledProcessError(result['attempts'][-1]['returncode'] if result['attempts'] else -1,
+                                            ns_train_command(folder_name, str(GPU_ID)))
+    return result
+
+
+def run_ns_train_batch(folder_names, devices=("0",), timeout=None, retries=1, log_dir="job_logs",
+                       base_command=NS_TRAIN_COMMAND):
+    """
+    Trains one model per rendered dataset folder, concurrently across devices
+    (see jobs.run_jobs). base_command can be swapped for a stub in tests, e.g.
+    [sys.executable, "-c", "print('trained')"].
+    """
+    jobs = [
+        Job(os.path.basename(os.path.normpath(folder_name)),
+            lambda device, folder_name=folder_name: ns_train_command(folder_name, device, base_command),
+            timeout=timeout, retries=retries)
+        for folder_name in folder_names
+    ]
+    return run_jobs(jobs, devices=devices, log_dir=log_dir)
+
+def run_ns_render(config, pose_file, output, device=None, **render_kwargs):
+    """
+    Renders every pose in pose_file (transforms.json or viewer camera_path.json)
+    with the trained model in config, in this process, loading the checkpoint once.
+    See novel_views.NovelViewRenderer.render for render_kwargs (video, fps, batch_size, ...).
+    """
+    # torch / nerfstudio are only needed here, keep them out of training-only imports
+    from novel_views import render_novel_views
+
+    num_frames = render_novel_views(config, output, pose_file=pose_file, device=device, **render_kwargs)
+    print(f"Rendering complete, {num_frames} frames written to {output}.")
+
+    return num_frames
 
 
 if __name__ == "__main__":
@@ -0,0 +1,335 @@
+"""
+End-to-end orchestrator: render -> export -> train -> evaluate, per mesh.
+
+Every stage run is keyed by a hash of its parameters and of the digest of
+what the upstream stage produced (not of the upstream parameters). A stage
+whose key matches its last successful run is skipped. Changing only the
+training parameters reruns train and evaluate, but not rendering. If a
+render rerun produces the same transforms.json, nothing downstream reruns.
+
+Meshes run concurrently. Stages that need a GPU take a device from a shared
+pool, one stage per device at a time.
+
+    python pipeline.py ../mesh_dir work --devices 0 1 --rot-res 6
+
+Layout under work_dir:
+    renders/{mesh}/            render_mesh output + transforms.json
+                               export's transforms_processed.json + poses_processed.npz (the ns-train dataset)
+    models/{mesh}/splatfacto/{key}/config.yml
+    evals/{mesh}/              eval_frames.csv, eval_summary.json (see evaluation.py)
+    state/{mesh}/{stage}.json  key, outputs (with their hashes) and digest of the last successful run
+    pipeline_report.json
+"""
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import shutil
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+from jobs import CPU, Job, run_job
+from manifest import file_hash
+from ns_train import NS_TRAIN_COMMAND, ns_train_command
+
+BLENDER_COMMAND = ["blender", "--background", "--python"]
+SPHERE_CAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sphere_cams.py")
+
+STAGES = ("render", "export", "train", "evaluate")
+
+DEFAULT_PARAMS = {
+    'render': {'rot_res': 4, 'FOV': 90, 'max_faces': None, 'sampler': "grid", 'sampler_kwargs': None,
+               'transparent': False, 'pose_file': None, 'passes': False},
+    'export': {'masks': False},
+    'train': {'command': NS_TRAIN_COMMAND, 'extra_args': []},
+    'evaluate': {'batch_size': 16, 'max_depth': None},
+}
+
+
+def stage_key(stage: str, params: dict, upstream: dict):
+    """
+    upstream: {name: digest} of everything the stage reads
+    """
+    blob = json.dumps({'stage': stage, 'params': params, 'upstream': upstream}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class StageState:
+    """
+    Record of a stage's last successful run, in state/{mesh}/{stage}.json
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as file:
+            return json.load(file)
+
+    def is_current(self, key: str):
+        """
+        The key matches and every output still hashes to what the run wrote,
+        so an output rewritten or deleted since then reruns the stage
+        """
+        record = self.load()
+        if record is None or record['key'] != key or 'hashes' not in record:
+            return False
+        return all(os.path.exists(path) and file_hash(path) == record['hashes'].get(name)
+                   for name, path in record['outputs'].items())
+
+    def save(self, key: str, outputs: dict, digest: str, seconds: float):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        hashes = {name: file_hash(path) for name, path in outputs.items()}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({'key': key, 'outputs': outputs, 'hashes': hashes, 'digest': digest, 'seconds': seconds},
+                      file, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+class DevicePool:
+    def __init__(self, devices):
+        self._free = queue.Queue()
+        for device in devices:
+            self._free.put(device)
+
+    def acquire(self):
+        return self._free.get()
+
+    def release(self, device):
+        self._free.put(device)
+
+
+def _run_command(name: str, command, device: str, log_dir: str):
+    os.makedirs(log_dir, exist_ok=True)
+    result = run_job(Job(name, command), device, os.path.join(log_dir, f"{name}.log"))
+    if result['status'] != "ok":
+        raise RuntimeError(f"{name} {result['status']}, see {result['log']}")
+
+
+def render_command(stl_fnames, output_dir: str, params: dict, blender=BLENDER_COMMAND):
+    """
+    Blender command line running sphere_cams.py on stl_fnames with render params
+    """
+    params = {**DEFAULT_PARAMS['render'], **params}
+    command = list(blender) + [SPHERE_CAMS, "--",
+                               "--stl", *[str(stl) for stl in stl_fnames],
+                               "--output", output_dir,
+                               "--rot-res", str(params['rot_res']),
+                               "--fov", str(params['FOV']),
+                               "--sampler", params['sampler']]
+    if params['max_faces'] is not None:
+        command += ["--max-faces", str(params['max_faces'])]
+    if params['sampler_kwargs']:
+        command += ["--sampler-kwargs", json.dumps(params['sampler_kwargs'])]
+    if params['transparent']:
+        command.append("--transparent")
+    if params['pose_file']:
+        command += ["--pose-file", params['pose_file']]
+    if params['passes']:
+        command.append("--passes")
+    return command
+
+
+def render_stage(ctx, params, upstream, device):
+    mesh_dir = os.path.join(ctx['work_dir'], "renders", ctx['mesh'])
+    command = render_command([ctx['stl']], os.path.join(ctx['work_dir'], "renders"), params, ctx['blender'])
+
+    _run_command(f"{ctx['mesh']}_render", command, device, ctx['log_dir'])
+
+    transforms = os.path.join(mesh_dir, "transforms.json")
+    return {'transforms': transforms}, file_hash(transforms)
+
+
+def export_stage(ctx, params, upstream, device):
+    """
+    Writes the training dataset next to the render as transforms_processed.json,
+    never touching render's transforms.json (a resumed render rewrites it)
+    """
+    from pose_store import save_pose_store
+    from postprocess import PROCESSED_NAME, postprocess_mesh
+
+    mesh_dir = os.path.join(ctx['work_dir'], "renders", ctx['mesh'])
+    transforms = os.path.join(mesh_dir, PROCESSED_NAME)
+    if params['masks']:
+        postprocess_mesh(mesh_dir)
+    else:
+        shutil.copyfile(ctx['outputs']['render']['transforms'], transforms)
+
+    # not poses.npz, that one belongs to the render and is rewritten with transforms.json
+    poses = os.path.join(mesh_dir, "poses_processed.npz")
+    with open(transforms, 'r') as file:
+        save_pose_store(poses, json.load(file))
+
+    return {'transforms': transforms, 'poses': poses}, file_hash(transforms)
+
+
+def train_stage(ctx, params, upstream, device):
+    models_dir = os.path.join(ctx['work_dir'], "models")
+    # the run is named after its key, so its config.yml path is known up front
+    timestamp = ctx['key'][:16]
+    # --data pointing at a transforms file makes nerfstudio read that one instead of transforms.json
+    dataset = ctx['outputs']['export']['transforms']
+
+    def command(device):
+        return (ns_train_command(dataset, device, params['command'])
+                + ["--output-dir", models_dir, "--experiment-name", ctx['mesh'], "--timestamp", timestamp]
+                + list(params['extra_args']))
+
+    _run_command(f"{ctx['mesh']}_train", command, device, ctx['log_dir'])
+
+    config = os.path.join(models_dir, ctx['mesh'], "splatfacto", timestamp, "config.yml")
+    # a checkpoint is too big to hash cheaply, and the key already pins down what produced it
+    return {'config': config}, ctx['key']
+
+
+def evaluate_stage(ctx, params, upstream, device):
+    from evaluation import evaluate_model
+
+    config = ctx['outputs']['train']['config']
+    transforms = ctx['outputs']['export']['transforms']
+    eval_dir = os.path.join(ctx['work_dir'], "evals", ctx['mesh'])
+
+    evaluate_model(config, transforms, eval_dir, batch_size=params['batch_size'],
+                   device="cpu" if device == CPU else f"cuda:{device}", max_depth=params['max_depth'])
+
+    summary = os.path.join(eval_dir, "eval_summary.json")
+    return {'summary': summary}, file_hash(summary)
+
+
+# name -> (function, upstream stages whose digests go into the key, needs a device)
+STAGE_FUNCTIONS = {
+    'render': (render_stage, (), True),
+    'export': (export_stage, ("render",), False),
+    'train': (train_stage, ("export",), True),
+    'evaluate': (evaluate_stage, ("train", "export"), True),
+}
+
+
+def run_mesh(stl_fname, work_dir: str, params: dict, pool: DevicePool, stages=STAGES,
+             blender=BLENDER_COMMAND, force=()):
+    """
+    Runs stages for one mesh in order, skipping those whose key is current.
+    returns {stage: {'status': "ran" | "skipped" | "failed", 'seconds', 'error'}}
+    """
+    mesh = pathlib.Path(stl_fname).stem
+    ctx = {'mesh': mesh, 'stl': str(stl_fname), 'work_dir': work_dir, 'blender': blender,
+           'log_dir': os.path.join(work_dir, "logs"), 'outputs': {}}
+    digests = {'stl': file_hash(stl_fname)}
+
+    report = {}
+    for stage in STAGES:
+        fn, deps, needs_device = STAGE_FUNCTIONS[stage]
+        state = StageState(os.path.join(work_dir, "state", mesh, f"{stage}.json"))
+
+        if stage not in stages:
+            # not requested this run, downstream stages build on its last result
+            record = state.load()
+            if record is not None:
+                ctx['outputs'][stage], digests[stage] = record['outputs'], record['digest']
+            continue
+
+        upstream = {dep: digests.get(dep) for dep in deps} if deps else {'stl': digests['stl']}
+        if stage == "render" and params['render']['pose_file']:
+            # the pose file is an input like the STL, replanning views must rerender
+            pose_file = params['render']['pose_file'].format(mesh=mesh)
+            upstream['pose_file'] = file_hash(pose_file) if os.path.exists(pose_file) else None
+        if None in upstream.values():
+            report[stage] = {'status': "failed", 'seconds': 0.0, 'error': "upstream stage missing"}
+            break
+
+        key = stage_key(stage, params[stage], upstream)
+
+        if stage not in force and state.is_current(key):
+            record = state.load()
+            ctx['outputs'][stage], digests[stage] = record['outputs'], record['digest']
+            report[stage] = {'status': "skipped", 'seconds': 0.0, 'error': None}
+            continue
+
+        ctx['key'] = key
+        device = pool.acquire() if needs_device else None
+        start = time.perf_counter()
+        try:
+            outputs, digest = fn(ctx, params[stage], upstream, device)
+        except Exception as e:
+            report[stage] = {'status': "failed", 'seconds': time.perf_counter() - start, 'error': repr(e)}
+            break
+        finally:
+            if needs_device:
+                pool.release(device)
+
+        seconds = time.perf_counter() - start
+        state.save(key, outputs, digest, seconds)
+        ctx['outputs'][stage], digests[stage] = outputs, digest
+        report[stage] = {'status': "ran", 'seconds': seconds, 'error': None}
+        print(f"[{mesh}] {stage} done in {seconds:.1f}s")
+
+    return report
+
+
+def collect_metrics(work_dir: str, results: dict):
+    """
+    {mesh: eval_summary.json contents} for meshes that have been evaluated
+    """
+    metrics = {}
+    for mesh in results:
+        summary = os.path.join(work_dir, "evals", mesh, "eval_summary.json")
+        if os.path.exists(summary):
+            with open(summary, 'r') as file:
+                metrics[mesh] = json.load(file)
+    return metrics
+
+
+def run_pipeline(mesh_dir: str, work_dir: str, params: dict = None, devices=("0",), num_meshes: int = None,
+                 stages=STAGES, blender=BLENDER_COMMAND, force=()):
+    """
+    params: per-stage overrides of DEFAULT_PARAMS, e.g. {'render': {'rot_res': 6}}
+    num_meshes: meshes in flight at once, defaults to one per device
+    force: stage names to rerun even if current
+    """
+    params = {stage: {**DEFAULT_PARAMS[stage], **(params or {}).get(stage, {})} for stage in STAGES}
+    stl_fnames = sorted(pathlib.Path(mesh_dir).glob('**/*.stl'))
+    pool = DevicePool(devices)
+
+    with ThreadPoolExecutor(num_meshes or len(devices)) as executor:
+        reports = list(executor.map(lambda stl: run_mesh(stl, work_dir, params, pool, stages, blender, force),
+                                    stl_fnames))
+
+    results = {stl.stem: report for stl, report in zip(stl_fnames, reports)}
+    os.makedirs(work_dir, exist_ok=True)
+    with open(os.path.join(work_dir, "pipeline_report.json"), 'w') as file:
+        json.dump({'params': params, 'meshes': results, 'metrics': collect_metrics(work_dir, results)}, file, indent=4)
+
+    failed = [mesh for mesh, report in results.items() if any(r['status'] == "failed" for r in report.values())]
+    print(f"{len(results) - len(failed)}/{len(results)} meshes completed")
+
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mesh_dir")
+    parser.add_argument("work_dir")
+    parser.add_argument("--devices", nargs="+", default=["0"])
+    parser.add_argument("--num-meshes", type=int, default=None)
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--force", nargs="+", default=[], choices=STAGES)
+    parser.add_argument("--params", type=json.loads, default=None,
+                        help="JSON per-stage overrides, e.g. '{\"train\": {\"extra_args\": [\"--max-num-iterations\", \"7000\"]}}'")
+    parser.add_argument("--rot-res", type=int, default=None)
+    parser.add_argument("--blender", default=None, help="blender executable")
+    args = parser.parse_args()
+
+    params = args.params or {}
+    if args.rot_res is not None:
+        params.setdefault('render', {})['rot_res'] = args.rot_res
+    blender = [args.blender] + BLENDER_COMMAND[1:] if args.blender else BLENDER_COMMAND
+
+    results = run_pipeline(args.mesh_dir, args.work_dir, params, args.devices, args.num_meshes,
+                           args.stages, blender, args.force)
+    sys.exit(0 if all(r['status'] != "failed" for report in results.values() for r in report.values()) else 1)
@@ -0,0 +1,110 @@
+"""
+Process-level cache of loaded nerfstudio pipelines.
+
+eval_setup reads the config and checkpoint from disk and moves the model to
+the device, which dominates short render requests. Pipelines are cached by
+config path, checkpoint mtime and device, and evicted least recently used
+first once their parameters exceed max_bytes.
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import torch
+
+from nerfstudio.utils.eval_utils import eval_setup
+
+# default budget for cached model parameters and buffers
+DEFAULT_MAX_BYTES = 8 * 1024 ** 3
+
+
+def checkpoint_mtime(config: str):
+    """
+    mtime of the newest checkpoint next to config (nerfstudio_models/*.ckpt),
+    so retraining into the same run dir invalidates the cache entry.
+    """
+    ckpt_dir = Path(config).parent / "nerfstudio_models"
+    ckpts = list(ckpt_dir.glob("*.ckpt")) if ckpt_dir.is_dir() else []
+    paths = ckpts or [Path(config)]
+    return max(os.path.getmtime(p) for p in paths)
+
+
+def pipeline_bytes(pipeline):
+    tensors = list(pipeline.parameters()) + list(pipeline.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def load_pipeline(config: str, device: Optional[str] = None):
+    _, pipeline, _, _ = eval_setup(
+        config_path=Path(config),
+        test_mode="test",
+    )
+
+    if device is not None:
+        pipeline.to(device)
+
+    return pipeline
+
+
+class PipelineCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (pipeline, size in bytes)
+        self._lock = threading.Lock()
+
+    def key(self, config: str, device: Optional[str] = None):
+        return (os.path.abspath(config), checkpoint_mtime(config), device)
+
+    def get(self, config: str, device: Optional[str] = None):
+        key = self.key(config, device)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+            # a stale entry for the same config/device (older checkpoint) can go right away
+            for stale in [k for k in self._entries if k[0] == key[0] and k[2] == key[2]]:
+                del self._entries[stale]
+
+            pipeline = load_pipeline(config, device)
+            self._entries[key] = (pipeline, pipeline_bytes(pipeline))
+            self._evict()
+
+            return pipeline
+
+    def _evict(self):
+        evicted = False
+        # never evict the entry that was just added
+        while len(self._entries) > 1 and self.total_bytes() > self.max_bytes:
+            self._entries.popitem(last=False)
+            evicted = True
+
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def total_bytes(self):
+        return sum(size for _, size in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = PipelineCache()
+
+
+def get_pipeline(config: str, device: Optional[str] = None):
+    return _cache.get(config, device)
+
+
+def get_cache():
+    return _cache
@@ -0,0 +1,135 @@
+"""
+Compact binary pose store, an alternative to pretty-printed transforms.json
+for large datasets.
+
+A store is an uncompressed .npz holding
+    c2w:        (N, 4, 4) camera-to-world matrices (float32 by default)
+    file_paths: (N,) image paths
+    meta:       JSON with the shared intrinsics and any extra per-frame keys
+
+Because the archive is stored uncompressed, load_pose_store memory-maps c2w
+straight out of the .npz instead of reading it. to_transforms / export_json
+convert back to standard nerfstudio transforms.json; with dtype=np.float64
+the round trip is exact.
+"""
+import json
+import zipfile
+import numpy as np
+
+# keys every frame has, everything else is carried in meta["frame_extras"]
+FRAME_KEYS = ('file_path', 'transform_matrix')
+
+
+def save_pose_store(path, transforms: dict, dtype=np.float32):
+    frames = transforms["frames"]
+    c2w = np.asarray([frame["transform_matrix"] for frame in frames], dtype=dtype).reshape(-1, 4, 4)
+    file_paths = np.asarray([frame.get("file_path", "") for frame in frames], dtype=str)
+
+    extras = [{k: v for k, v in frame.items() if k not in FRAME_KEYS} for frame in frames]
+    meta = {
+        'intrinsics': {k: v for k, v in transforms.items() if k != "frames"},
+        'frame_extras': extras if any(extras) else None,
+    }
+
+    # np.savez (not savez_compressed) so c2w stays memory-mappable
+    with open(path, 'wb') as file:
+        np.savez(file, c2w=c2w, file_paths=file_paths, meta=np.asarray(json.dumps(meta)))
+
+
+def _mmap_npz_member(path, name: str):
+    """
+    Memory-maps the array stored as {name}.npy inside an uncompressed .npz.
+    """
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{name} in {path} is compressed and can't be memory-mapped")
+
+    with open(path, 'rb') as file:
+        # local file header: 30 fixed bytes, then the file name and extra field
+        file.seek(info.header_offset + 26)
+        name_len, extra_len = np.frombuffer(file.read(4), dtype='<u2')
+        file.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        offset = file.tell()
+
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+class PoseStore:
+    def __init__(self, c2w, file_paths, intrinsics: dict, frame_extras=None):
+        self.c2w = c2w
+        self.file_paths = file_paths
+        self.intrinsics = intrinsics
+        self.frame_extras = frame_extras
+
+    def __len__(self):
+        return len(self.c2w)
+
+    def to_transforms(self):
+        """
+        Standard nerfstudio transforms.json dict
+        """
+        frames = []
+        for i in range(len(self)):
+            frame = {'file_path': str(self.file_paths[i]),
+                     'transform_matrix': np.asarray(self.c2w[i], dtype=np.float64).tolist()}
+            if self.frame_extras:
+                frame.update(self.frame_extras[i])
+            frames.append(frame)
+
+        return {**self.intrinsics, 'frames': frames}
+
+
+def load_pose_store(path, mmap: bool = True):
+    with np.load(path) as data:
+        file_paths = data["file_paths"]
+        meta = json.loads(str(data["meta"]))
+        c2w = None if mmap else data["c2w"]
+
+    if mmap:
+        c2w = _mmap_npz_member(path, "c2w")
+
+    return PoseStore(c2w, file_paths, meta["intrinsics"], meta.get("frame_extras"))
+
+
+def load_transforms(path):
+    """
+    transforms dict from either a transforms.json or a pose store .npz
+    """
+    if str(path).endswith(".npz"):
+        return load_pose_store(path).to_transforms()
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def export_json(store_path, json_path):
+    from get_camera_info import save_json
+
+    save_json(load_pose_store(store_path).to_transforms(), json_path)
+
+
+def import_json(json_path, store_path, dtype=np.float32):
+    with open(json_path, 'r') as file:
+        save_pose_store(store_path, json.load(file), dtype)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="convert between transforms.json and pose store .npz")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--float64", action="store_true", help="store matrices as float64 (exact round trip)")
+    args = parser.parse_args()
+
+    if args.src.endswith(".npz"):
+        export_json(args.src, args.dst)
+    else:
+        import_json(args.src, args.dst, np.float64 if args.float64 else np.float32)
@@ -0,0 +1,215 @@
+"""
+Pure NumPy camera pose math. Nothing in here touches bpy, so whole pose sets
+can be generated and checked before any rendering starts.
+
+All camera-to-world matrices follow the Blender / nerfstudio (OpenGL)
+convention: the camera looks down its local -Z axis with +Y up.
+"""
+import math
+import numpy as np
+
+
+def get_rot_matrix(angle, axis):
+    cos, sin = math.cos, math.sin
+    if axis == 'Z':
+        rot_matrix = np.array([
+            [cos(angle), -sin(angle), 0],
+            [sin(angle), cos(angle), 0],
+            [0, 0, 1]
+            ])
+    elif axis == 'Y':
+        rot_matrix = np.array([
+            [cos(angle), 0, sin(angle)],
+            [0, 1, 0],
+            [-sin(angle), 0, -cos(angle)]
+            ])
+    elif axis == 'X':
+        rot_matrix = np.array([
+            [1, 0, 0],
+            [0, cos(angle), -sin(angle)],
+            [0, sin(angle), cos(angle)]
+            ])
+    else:
+        raise AssertionError("axis must be 'X', 'Y', or 'Z'")
+
+    return rot_matrix
+
+
+def look_at(eyes, target=(0, 0, 0), up=(0, 0, 1)):
+    """
+    eyes: (N, 3) camera positions
+    target: (3,) or (N, 3) point(s) the cameras look at
+    up: world up hint, the camera's +Y is kept as close to it as possible
+
+    returns (N, 4, 4) camera-to-world matrices, the same orientation Blender's
+    TRACK_TO constraint (track -Z, up Y) gives a camera at eye aimed at target
+    """
+    eyes = np.atleast_2d(np.asarray(eyes, dtype=np.float64))
+    target = np.broadcast_to(np.asarray(target, dtype=np.float64), eyes.shape)
+    up = np.broadcast_to(np.asarray(up, dtype=np.float64), eyes.shape)
+
+    forward = target - eyes
+    forward /= np.linalg.norm(forward, axis=-1, keepdims=True)
+
+    right = np.cross(forward, up)
+    right_norm = np.linalg.norm(right, axis=-1, keepdims=True)
+
+    # looking straight along the up hint, pick world Y as the up hint instead
+    degenerate = right_norm[:, 0] < 1e-8
+    if np.any(degenerate):
+        right[degenerate] = np.cross(forward[degenerate], np.array([0.0, 1.0, 0.0]))
+        right_norm[degenerate] = np.linalg.norm(right[degenerate], axis=-1, keepdims=True)
+
+    right /= right_norm
+    cam_up = np.cross(right, forward)
+
+    c2w = np.zeros((len(eyes), 4, 4))
+    c2w[:, :3, 0] = right
+    c2w[:, :3, 1] = cam_up
+    c2w[:, :3, 2] = -forward
+    c2w[:, :3, 3] = eyes
+    c2w[:, 3, 3] = 1.0
+
+    return c2w
+
+
+def orbit_angles(rot_res: int):
+    """
+    The (rotz, roty) grid render_dir walks, flattened in render order:
+    roty (elevation) in the outer loop, rotz (azimuth) in the inner loop.
+    """
+    rotz_incr, roty_incr = (2 * math.pi) / rot_res, math.pi / rot_res
+
+    roty = -rot_res / 2 * roty_incr + roty_incr * np.arange(rot_res)
+    rotz = rotz_incr * np.arange(rot_res)
+
+    roty, rotz = np.meshgrid(roty, rotz, indexing='ij')
+    return rotz.ravel(), roty.ravel()
+
+
+def orbit_positions(rotz, roty, radius: float):
+    """
+    Closed form of rotating (radius, 0, 0) by get_rot_matrix(roty, 'Y') and
+    then get_rot_matrix(rotz, 'Z'), as the old per-frame rotate_camera did, for all angles at once.
+    """
+    rotz, roty = np.asarray(rotz), np.asarray(roty)
+    return radius * np.stack([
+        np.cos(roty) * np.cos(rotz),
+        -np.cos(roty) * np.sin(rotz),
+        np.sin(roty),
+    ], axis=-1)
+
+
+def orbit_poses(rot_res: int, radius: float = math.sqrt(30), target=(0, 0, 0)):
+    """
+    returns ((rot_res**2, 4, 4) camera-to-world matrices, frame names)
+    """
+    rotz, roty = orbit_angles(rot_res)
+    c2w = look_at(orbit_positions(rotz, roty, radius), target)
+    names = [f"{z:.2f}_{y:.2f}" for z, y in zip(rotz, roty)]
+
+    return c2w, names
+
+
+def _directions(u, v, upper_hemisphere: bool = False):
+    """
+    Maps (u, v) in [0, 1)^2 to unit directions, area-uniformly: z is linear in
+    u, the azimuth is 2 * pi * v.
+    """
+    z = u if upper_hemisphere else 1 - 2 * u
+    r = np.sqrt(np.clip(1 - z ** 2, 0, None))
+    phi = 2 * math.pi * v
+    return np.stack([r * np.cos(phi), r * np.sin(phi), z], axis=-1)
+
+
+def _radical_inverse_base2(i):
+    i = np.asarray(i, dtype=np.uint64)
+    result = np.zeros(i.shape, dtype=np.float64)
+    scale = 0.5
+    while np.any(i):
+        result += (i & np.uint64(1)) * scale
+        i = i >> np.uint64(1)
+        scale /= 2
+    return result
+
+
+def fibonacci_directions(num_views: int, upper_hemisphere: bool = False, seed=None):
+    i = np.arange(num_views)
+    golden_ratio = (1 + math.sqrt(5)) / 2
+    return _directions((i + 0.5) / num_views, (i / golden_ratio) % 1.0, upper_hemisphere)
+
+
+def hammersley_directions(num_views: int, upper_hemisphere: bool = False, seed=None):
+    i = np.arange(num_views)
+    return _directions((i + 0.5) / num_views, _radical_inverse_base2(i), upper_hemisphere)
+
+
+def stratified_directions(num_views: int, upper_hemisphere: bool = False, seed=None):
+    """
+    Latin hypercube: one jittered sample per stratum of z and of the azimuth,
+    with the azimuth strata shuffled. Reproducible for a fixed seed.
+    """
+    rng = np.random.default_rng(seed)
+    u = (np.arange(num_views) + rng.random(num_views)) / num_views
+    v = (rng.permutation(num_views) + rng.random(num_views)) / num_views
+    return _directions(u, v, upper_hemisphere)
+
+
+SAMPLERS = {
+    'fibonacci': fibonacci_directions,
+    'hammersley': hammersley_directions,
+    'stratified': stratified_directions,
+}
+
+
+def sample_poses(sampler: str, num_views: int, radius=math.sqrt(30), upper_hemisphere: bool = False,
+                 seed=None, target=(0, 0, 0)):
+    """
+    Camera-to-world matrices for num_views cameras looking at target, spread
+    over the sphere (or upper hemisphere) by one of SAMPLERS.
+
+    radius: a distance, or a (min, max) range to sample distances from uniformly
+
+    returns ((num_views, 4, 4) camera-to-world matrices, frame names)
+    """
+    if sampler not in SAMPLERS:
+        raise ValueError(f"sampler must be one of {list(SAMPLERS)}, got {sampler}")
+
+    directions = SAMPLERS[sampler](num_views, upper_hemisphere, seed)
+
+    if np.ndim(radius) == 0:
+        radii = np.full(num_views, float(radius))
+    else:
+        radii = np.random.default_rng(seed).uniform(radius[0], radius[1], num_views)
+
+    eyes = np.asarray(target, dtype=np.float64) + directions * radii[:, None]
+    names = [f"view_{i:04d}" for i in range(num_views)]
+
+    return look_at(eyes, target), names
+
+
+def validate_poses(c2w, atol: float = 1e-6):
+    """
+    Raises ValueError unless every matrix is a finite rigid transform.
+    """
+    c2w = np.asarray(c2w)
+    if c2w.ndim != 3 or c2w.shape[1:] != (4, 4):
+        raise ValueError(f"expected (N, 4, 4) poses, got {c2w.shape}")
+    if not np.all(np.isfinite(c2w)):
+        raise ValueError("poses contain non-finite values")
+
+    rot = c2w[:, :3, :3]
+    orthonormal = np.abs(rot @ rot.transpose(0, 2, 1) - np.eye(3)).max(axis=(1, 2)) <= atol
+    right_handed = np.abs(np.linalg.det(rot) - 1.0) <= atol
+    bottom_row = np.abs(c2w[:, 3] - np.array([0, 0, 0, 1])).max(axis=1) <= atol
+
+    bad = np.flatnonzero(~(orthonormal & right_handed & bottom_row))
+    if len(bad):
+        raise ValueError(f"{len(bad)} invalid poses, first at index {bad[0]}")
+
+
+def make_frames(c2w, names):
+    return [
+        {'file_path': f"{name}.png", 'transform_matrix': pose.tolist()}
+        for pose, name in zip(np.asarray(c2w), names)
+    ]
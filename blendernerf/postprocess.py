@@ -0,0 +1,224 @@
+"""
+Post-render pass over an output tree: foreground masks, per-frame bounding
+boxes and a scene aabb_scale, written to each mesh's transforms_processed.json
+(and transforms_{f}_processed.json per pyramid level). Train on those, e.g.
+ns-train ... --data outputs/bunny/transforms_processed.json.
+
+Masks come from the image alpha (render with render_mesh(..., transparent=True))
+or, if a frame already has a mask_path (an object-index pass), from that file.
+Meshes are processed in parallel, one per worker process.
+
+    python postprocess.py outputs --workers 8
+"""
+import os
+import re
+import json
+import math
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from get_camera_info import save_json
+
+# instant-ngp's default pose scale, used when transforms.json doesn't set "scale"
+NGP_SCALE = 0.33
+MAX_AABB_SCALE = 128
+
+PROCESSED_SUFFIX = "_processed"
+PROCESSED_NAME = f"transforms{PROCESSED_SUFFIX}.json"
+# pyramid levels written by pyramid.export_pyramid
+LEVEL_PATTERN = re.compile(r"^transforms_(\d+)\.json$")
+
+
+def load_mask(mesh_dir: str, frame: dict, alpha_threshold: int = 128):
+    """
+    returns (H, W) bool foreground mask, or None if the frame has neither
+    a mask pass nor a usable alpha channel
+    """
+    from PIL import Image
+
+    if "mask_path" in frame:
+        with Image.open(os.path.join(mesh_dir, frame["mask_path"])) as img:
+            return np.asarray(img.convert("L")) >= alpha_threshold
+
+    with Image.open(os.path.join(mesh_dir, frame["file_path"])) as img:
+        if img.mode not in ("RGBA", "LA"):
+            return None
+        alpha = np.asarray(img.getchannel("A"))
+
+    # fully opaque: rendered against the sky sphere, alpha says nothing about the object
+    if alpha.min() == 255:
+        return None
+    return alpha >= alpha_threshold
+
+
+def mask_bbox(mask):
+    """
+    [x_min, y_min, x_max, y_max] in pixels (inclusive), or None for an empty mask
+    """
+    cols, rows = np.flatnonzero(mask.any(axis=0)), np.flatnonzero(mask.any(axis=1))
+    if len(cols) == 0:
+        return None
+    return [int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])]
+
+
+def bounding_radius(bboxes, c2w, fl_x, fl_y, cx, cy, target=(0, 0, 0)):
+    """
+    Radius of a sphere around target that contains what every view saw, from
+    the silhouette extents. Assumes the cameras look at target (as every
+    render_dir pose set does), so the principal point projects onto it.
+
+    bboxes: (N, 4) pixel boxes, the remaining arguments per frame (N,) or scalars
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64)
+    dist = np.linalg.norm(np.asarray(c2w)[:, :3, 3] - np.asarray(target), axis=-1)
+
+    # pixel edges, not centers: the box covers x_min .. x_max + 1
+    extent_x = np.maximum(np.abs(bboxes[:, 0] - cx), np.abs(bboxes[:, 2] + 1 - cx)) / fl_x
+    extent_y = np.maximum(np.abs(bboxes[:, 1] - cy), np.abs(bboxes[:, 3] + 1 - cy)) / fl_y
+    angle = np.arctan(np.maximum(extent_x, extent_y))
+
+    # the silhouette edge ray is tangent to the bounding sphere
+    return float(np.max(dist * np.sin(angle)))
+
+
+def aabb_scale(radius: float, scale: float = NGP_SCALE):
+    """
+    Smallest power of two whose instant-ngp box (side aabb_scale in scaled
+    units) holds a sphere of this radius
+    """
+    needed = 2 * radius * scale
+    return int(min(MAX_AABB_SCALE, 2 ** max(0, math.ceil(math.log2(max(needed, 1e-9))))))
+
+
+def _frame_mask(mesh_dir: str, frame: dict, alpha_threshold: int, mask_dir: str):
+    """
+    Loads (or derives from alpha and writes to masks/) the frame's mask, sets frame["mask_path"]
+    """
+    from PIL import Image
+
+    mask = load_mask(mesh_dir, frame, alpha_threshold)
+    if mask is None:
+        raise ValueError(f"{frame['file_path']} has no alpha or mask pass, render with transparent=True")
+
+    if "mask_path" not in frame:
+        os.makedirs(os.path.join(mesh_dir, mask_dir), exist_ok=True)
+        mask_path = f"{mask_dir}/{pathlib.Path(frame['file_path']).stem}.png"
+        Image.fromarray(mask.astype(np.uint8) * 255).save(os.path.join(mesh_dir, mask_path), compress_level=1)
+        frame["mask_path"] = mask_path
+
+    return mask
+
+
+def _process_level(mesh_dir: str, level_path: str, factor: int, full_frames: dict, scene_fields: dict):
+    """
+    transforms_{factor}_processed.json for a pyramid level: the full resolution
+    masks box-downsampled into masks_{factor}/, bboxes from those, same scene fields
+    """
+    from PIL import Image
+
+    with open(level_path, 'r') as file:
+        level = json.load(file)
+
+    mask_dir = f"masks_{factor}"
+    os.makedirs(os.path.join(mesh_dir, mask_dir), exist_ok=True)
+    for frame in level["frames"]:
+        full = full_frames[os.path.basename(frame["file_path"])]
+        # the level image's own size, pyramid.downsample_image floors it
+        with Image.open(os.path.join(mesh_dir, frame["file_path"])) as img:
+            size = img.size
+
+        with Image.open(os.path.join(mesh_dir, full["mask_path"])) as img:
+            small = img.convert("L").resize(size, Image.BOX)
+        mask = np.asarray(small) >= 128
+
+        frame["mask_path"] = f"{mask_dir}/{pathlib.Path(frame['file_path']).stem}.png"
+        Image.fromarray(mask.astype(np.uint8) * 255).save(os.path.join(mesh_dir, frame["mask_path"]), compress_level=1)
+        frame["bbox"] = mask_bbox(mask)
+
+    level.update(scene_fields)
+    save_json(level, os.path.join(mesh_dir, f"transforms_{factor}{PROCESSED_SUFFIX}.json"))
+
+
+def postprocess_mesh(mesh_dir: str, alpha_threshold: int = 128, margin: float = 1.1):
+    """
+    Reads {mesh_dir}/transforms.json and writes transforms_processed.json with
+    mask_path and bbox on every frame and aabb_scale / object_radius on top.
+    Masks taken from alpha are written to masks/. Pyramid levels
+    (transforms_{f}.json) get a transforms_{f}_processed.json alongside.
+
+    transforms.json itself is left alone, it belongs to the render and is
+    rewritten whenever a render resumes.
+    """
+    with open(os.path.join(mesh_dir, "transforms.json"), 'r') as file:
+        transforms = json.load(file)
+
+    boxes, poses, intrinsics = [], [], []
+    for frame in transforms["frames"]:
+        mask = _frame_mask(mesh_dir, frame, alpha_threshold, "masks")
+
+        frame["bbox"] = mask_bbox(mask)
+        if frame["bbox"] is not None:
+            boxes.append(frame["bbox"])
+            poses.append(frame["transform_matrix"])
+            intrinsics.append([frame.get(k, transforms.get(k)) for k in ("fl_x", "fl_y", "cx", "cy")])
+
+    scene_fields = {}
+    if boxes:
+        fl_x, fl_y, cx, cy = np.asarray(intrinsics, dtype=np.float64).T
+        radius = margin * bounding_radius(boxes, poses, fl_x, fl_y, cx, cy)
+        scene_fields = {'object_radius': radius, 'aabb_scale': aabb_scale(radius, transforms.get("scale", NGP_SCALE))}
+    transforms.update(scene_fields)
+
+    save_json(transforms, os.path.join(mesh_dir, PROCESSED_NAME))
+
+    full_frames = {os.path.basename(frame["file_path"]): frame for frame in transforms["frames"]}
+    for fname in sorted(os.listdir(mesh_dir)):
+        match = LEVEL_PATTERN.match(fname)
+        if match:
+            _process_level(mesh_dir, os.path.join(mesh_dir, fname), int(match.group(1)), full_frames, scene_fields)
+
+    return {
+        'mesh': mesh_dir,
+        'frames': len(transforms["frames"]),
+        'empty_frames': len(transforms["frames"]) - len(boxes),
+        'aabb_scale': transforms.get("aabb_scale"),
+    }
+
+
+def _postprocess_worker(args):
+    mesh_dir, kwargs = args
+    try:
+        return {**postprocess_mesh(mesh_dir, **kwargs), 'success': True, 'error': None}
+    except Exception as e:
+        return {'mesh': mesh_dir, 'success': False, 'error': repr(e)}
+
+
+def postprocess_dir(output_dir: str, num_workers: int = 4, **kwargs):
+    """
+    Runs postprocess_mesh over every {output_dir}/<mesh>/transforms.json.
+    Returns one result dict per mesh, failures included.
+    """
+    mesh_dirs = sorted(str(path.parent) for path in pathlib.Path(output_dir).glob("*/transforms.json"))
+
+    with ProcessPoolExecutor(num_workers) as pool:
+        results = list(pool.map(_postprocess_worker, [(mesh_dir, kwargs) for mesh_dir in mesh_dirs]))
+
+    for result in results:
+        status = f"aabb_scale {result['aabb_scale']}" if result['success'] else f"FAILED {result['error']}"
+        print(f"{result['mesh']}: {status}")
+
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--alpha-threshold", type=int, default=128)
+    args = parser.parse_args()
+
+    postprocess_dir(args.output_dir, args.workers, alpha_threshold=args.alpha_threshold)
@@ -0,0 +1,141 @@
+"""
+Per-stage timing for render runs.
+
+    profiler = RenderProfiler()
+    with profiler.stage("render", mesh="bunny", frame="0.00_-1.57"):
+        bpy.ops.render.render()
+    profiler.write_report("outputs/render_report")
+
+writes render_report.json (records, datablock counts, summary) and
+render_report.csv (one row per timed stage) and prints a short summary.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RenderProfiler:
+    CSV_FIELDS = ("stage", "mesh", "frame", "seconds", "peak_rss_mb", "pid")
+
+    def __init__(self):
+        self.records = []
+        self.datablocks = {}
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, mesh: str = None, frame=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, mesh, frame)
+
+    def add(self, name: str, seconds: float, mesh: str = None, frame=None):
+        record = {
+            'stage': name,
+            'mesh': mesh,
+            'frame': frame,
+            'seconds': seconds,
+            'peak_rss_mb': peak_rss_mb(),
+            'pid': os.getpid(),
+        }
+        with self._lock:
+            self.records.append(record)
+
+    def record_datablocks(self, mesh: str, counts: dict):
+        """
+        counts: e.g. scene_utils.datablock_counts() after the mesh finished
+        """
+        self.datablocks[mesh] = counts
+
+    def merge(self, records, datablocks=None):
+        """
+        Folds in records collected by another process (e.g. a render_dir_sharded worker).
+        """
+        with self._lock:
+            self.records.extend(records)
+        self.datablocks.update(datablocks or {})
+
+    def summary(self, num_slowest: int = 5):
+        wall = time.perf_counter() - self.start
+
+        stages = {}
+        meshes = {}
+        frames = set()
+        for r in self.records:
+            stage = stages.setdefault(r['stage'], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            stage['count'] += 1
+            stage['seconds'] += r['seconds']
+            stage['max_seconds'] = max(stage['max_seconds'], r['seconds'])
+
+            if r['mesh'] is not None:
+                meshes[r['mesh']] = meshes.get(r['mesh'], 0.0) + r['seconds']
+            if r['stage'] == 'render' and r['frame'] is not None:
+                frames.add((r['mesh'], r['frame']))
+
+        for stage in stages.values():
+            stage['mean_seconds'] = stage['seconds'] / stage['count']
+
+        slowest = sorted(meshes.items(), key=lambda m: m[1], reverse=True)[:num_slowest]
+        rss = [r['peak_rss_mb'] for r in self.records if r['peak_rss_mb'] is not None]
+
+        return {
+            'wall_seconds': wall,
+            'num_frames': len(frames),
+            'frames_per_sec': len(frames) / wall if wall > 0 else 0.0,
+            'num_meshes': len(meshes),
+            'stages': stages,
+            'slowest_meshes': [{'mesh': m, 'seconds': t} for m, t in slowest],
+            'peak_rss_mb': max(rss) if rss else None,
+        }
+
+    def print_summary(self, summary=None):
+        summary = summary or self.summary()
+        print(f"{summary['num_frames']} frames from {summary['num_meshes']} meshes in "
+              f"{summary['wall_seconds']:.1f}s ({summary['frames_per_sec']:.2f} frames/sec)")
+        for name, stage in sorted(summary['stages'].items(), key=lambda s: s[1]['seconds'], reverse=True):
+            print(f"    {name:<14} {stage['seconds']:9.2f}s total  {stage['mean_seconds']:8.4f}s mean  x{stage['count']}")
+        for mesh in summary['slowest_meshes']:
+            print(f"    slow: {mesh['mesh']} {mesh['seconds']:.2f}s")
+        if summary['peak_rss_mb'] is not None:
+            print(f"    peak RSS {summary['peak_rss_mb']:.0f} MB")
+
+    def write_report(self, path_prefix: str):
+        """
+        Writes {path_prefix}.json and {path_prefix}.csv, returns the summary dict.
+        """
+        summary = self.summary()
+
+        directory = os.path.dirname(path_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(f"{path_prefix}.json", 'w') as file:
+            json.dump({'summary': summary, 'datablocks': self.datablocks, 'records': self.records}, file, indent=4)
+
+        with open(f"{path_prefix}.csv", 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=self.CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+        self.print_summary(summary)
+
+        return summary
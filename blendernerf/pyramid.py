@@ -0,0 +1,65 @@
+"""
+Multi-resolution dataset export: one full-resolution render feeds every scale.
+
+For each factor f the images listed in transforms.json are box-downsampled
+into images_{f}/ (the folder naming nerfstudio's downscale_factor expects)
+and a transforms_{f}.json with matching intrinsics is written next to them.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from get_camera_info import save_json
+
+FULL_RES_KEYS = ("depth_file_path", "depth_exr_path", "normal_path", "mask_path", "bbox")
+
+
+def downsample_image(src, dst, factor: int):
+    from PIL import Image
+
+    # skip images already exported from this exact source render
+    if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+        return dst
+
+    with Image.open(src) as img:
+        small = img.resize((img.width // factor, img.height // factor), Image.BOX)
+        small.save(dst, compress_level=1)
+
+    return dst
+
+
+def export_pyramid(mesh_output_dir: str, transforms: dict, level_intrinsics: dict, num_threads: int = 8):
+    """
+    mesh_output_dir: directory holding the full resolution images and transforms.json
+    transforms: the full resolution transforms.json dict
+    level_intrinsics: {factor: intrinsics dict}, e.g. from
+        get_camera_intrinsics(scene, camera, downscale=factor)
+
+    returns {factor: path of transforms_{factor}.json}
+    """
+    jobs = []
+    level_transforms = {}
+    for factor, intrinsics in level_intrinsics.items():
+        level_dir = os.path.join(mesh_output_dir, f"images_{factor}")
+        os.makedirs(level_dir, exist_ok=True)
+
+        frames = []
+        for frame in transforms["frames"]:
+            fname = os.path.basename(frame["file_path"])
+            src = os.path.join(mesh_output_dir, frame["file_path"])
+            jobs.append((src, os.path.join(level_dir, fname), factor))
+            # render pass files stay full resolution, so they're not listed for the smaller levels
+            level_frame = {k: v for k, v in frame.items() if k not in FULL_RES_KEYS}
+            frames.append({**level_frame, "file_path": f"images_{factor}/{fname}"})
+
+        level_transforms[factor] = {**intrinsics, "frames": frames}
+
+    # PIL releases the GIL while resizing and encoding, so threads scale here
+    with ThreadPoolExecutor(num_threads) as pool:
+        list(pool.map(lambda job: downsample_image(*job), jobs))
+
+    paths = {}
+    for factor, level in level_transforms.items():
+        paths[factor] = os.path.join(mesh_output_dir, f"transforms_{factor}.json")
+        save_json(level, paths[factor])
+
+    return paths
@@ -1,77 +1,241 @@
 import json
-from pathlib import Path
-from typing import Literal, Tuple, Dict
-import tqdm
-import os
+from typing import Literal, Optional, Tuple, Dict
+import time
 
-import matplotlib.pyplot as plt
 import torch
 import numpy as np
 
-from nerfstudio.utils.eval_utils import eval_setup
 from nerfstudio.cameras.cameras import Cameras
 
+from image_writer import ImageWriter
+from depth_io import DEPTH_PNG_SCALE, PNG_SCALES, save_meta
+from profiling import RenderProfiler
+from pipeline_cache import get_pipeline, load_pipeline
+from pose_store import PoseStore, load_pose_store
 
-def _setup(config: str, camera_poses: str):
+
+def model_space_c2w(pipeline, c2w):
     """
-    config: path to model training run config
-    camera_poses: str path to transforms.json formatted camera poses
+    (N, 4, 4) world space camera-to-world matrices (e.g. from render_dir) in the
+    model's normalized space: the dataparser's orientation transform, then its scale
+    """
+    outputs = pipeline.datamanager.train_dataparser_outputs
+    transform = outputs.dataparser_transform.cpu().double().numpy()
+    scale = float(outputs.dataparser_scale)
+
+    c2w = np.asarray(c2w, dtype=np.float64)
+    mapped = np.broadcast_to(np.eye(4), c2w.shape).copy()
+    mapped[:, :3] = transform @ c2w
+    mapped[:, :3, 3] *= scale
+    return mapped
+
+
+def to_model_space(pipeline, transforms: dict):
+    """
+    transforms dict with every frame's transform_matrix mapped by model_space_c2w
+    """
+    c2w = model_space_c2w(pipeline, [frame["transform_matrix"] for frame in transforms["frames"]])
+    frames = [{**frame, 'transform_matrix': pose.tolist()} for frame, pose in zip(transforms["frames"], c2w)]
+    return {**transforms, 'frames': frames}
+
+
+def _cameras_from_transforms(transforms: dict, device) -> Cameras:
+    """
+    Builds one stacked Cameras object holding every pose in a transforms.json dict
     """
+    frames = transforms["frames"]
+
+    camera_to_worlds = torch.tensor([frame["transform_matrix"] for frame in frames], dtype=torch.float32)[:, :3, :]
+
+    # per-frame intrinsics override the shared ones, as in nerfstudio
+    def _column(key, dtype=torch.float32):
+        return torch.tensor([[frame.get(key, transforms.get(key))] for frame in frames], dtype=dtype)
+
+    fx, fy = _column("fl_x"), _column("fl_y")
+    cx, cy = _column("cx"), _column("cy")
+    w, h = _column("w", torch.int), _column("h", torch.int)
+
+    return Cameras(camera_to_worlds, fx, fy, cx, cy, w, h).to(device)
+
+
+def _cameras_from_store(store: PoseStore, device) -> Cameras:
+    """
+    Cameras straight from a pose store's (N, 4, 4) array, without building per-frame lists
+    """
+    if store.frame_extras and any(k in extra for extra in store.frame_extras for k in ("fl_x", "fl_y", "cx", "cy", "w", "h")):
+        return _cameras_from_transforms(store.to_transforms(), device)
+
+    num_cameras = len(store)
+    camera_to_worlds = torch.from_numpy(np.ascontiguousarray(store.c2w[:, :3, :], dtype=np.float32))
+
+    def _column(key, dtype=torch.float32):
+        return torch.full((num_cameras, 1), store.intrinsics[key], dtype=dtype)
+
+    fx, fy = _column("fl_x"), _column("fl_y")
+    cx, cy = _column("cx"), _column("cy")
+    w, h = _column("w", torch.int), _column("h", torch.int)
 
-    _, pipeline, _, _ = eval_setup(
-        config_path=Path(config),
-        test_mode="test",
-    )
+    return Cameras(camera_to_worlds, fx, fy, cx, cy, w, h).to(device)
 
-    camera_poses_path = "test_poses.json"
-    with open(camera_poses_path, "r") as f:
+
+def _load_cameras(camera_poses: str, pipeline, model_space: bool = False) -> Cameras:
+    """
+    camera_poses: a transforms.json, or a pose store .npz (see pose_store), in
+        render_dir's world space unless model_space (see novel_views)
+    """
+    if str(camera_poses).endswith(".npz"):
+        store = load_pose_store(camera_poses)
+        if not model_space:
+            store = PoseStore(model_space_c2w(pipeline, store.c2w), store.file_paths, store.intrinsics,
+                              store.frame_extras)
+        return _cameras_from_store(store, pipeline.device)
+
+    with open(camera_poses, "r") as f:
         camera_poses = json.load(f)
+    if not model_space:
+        camera_poses = to_model_space(pipeline, camera_poses)
 
-    num_cameras = len(camera_poses["frames"])
-    cameras = []
+    return _cameras_from_transforms(camera_poses, pipeline.device)
 
-    for i in range(num_cameras):
-        camera_to_worlds = torch.tensor(camera_poses["frames"][i]["transform_matrix"][:3]).view(1, 3, 4)
-        fx, fy = torch.tensor(camera_poses["fl_x"]).view(1, 1), torch.tensor(camera_poses["fl_y"]).view(1, 1)
-        cx, cy = torch.tensor(camera_poses["cx"]).view(1, 1), torch.tensor(camera_poses["cy"]).view(1, 1)
-        w, h = torch.tensor(camera_poses["w"], dtype=torch.int).view(1, 1), torch.tensor(camera_poses["h"], dtype=torch.int).view(1, 1)
 
-        camera = Cameras(camera_to_worlds, fx, fy, cx, cy, w, h).to(pipeline.device)
-        cameras.append(camera)
+def _load_pipeline(config: str, device: Optional[str] = None, use_cache: bool = True):
+    """
+    Repeated calls for the same config and checkpoint reuse the pipeline
+    loaded by the first one (see pipeline_cache).
+    """
+    if use_cache:
+        return get_pipeline(config, device)
+    return load_pipeline(config, device)
+
+
+def _setup(config: str, camera_poses: str, device: Optional[str] = None, model_space: bool = False):
+    """
+    config: path to model training run config
+    camera_poses: str path to transforms.json formatted camera poses
+    device: move the pipeline here after loading, e.g. "cpu" for testing
+    model_space: the poses are already in the model's normalized space (e.g.
+        test_poses.json), otherwise they're world space and get mapped into it
+    """
+    pipeline = _load_pipeline(config, device)
+    cameras = _load_cameras(camera_poses, pipeline, model_space)
 
-        return pipeline, cameras
+    return pipeline, cameras
 
 
-def render_depth_imgs(config: str, camera_poses: str):
-    pipeline, cameras = _setup(config, camera_poses)
+def render_cameras(pipeline, cameras: Cameras, output_names: Tuple[str, ...] = ("rgb",), batch_size: int = 16,
+                   profiler: Optional[RenderProfiler] = None):
+    """
+    Renders every camera with an already loaded pipeline, batch_size cameras per
+    chunk, and yields one {output_name: tensor} dict per camera. Outputs of a
+    chunk stay on the device and are moved to the CPU in one transfer per
+    output. batch_size=1 is the old one-camera-at-a-time loop, for comparison.
+    """
+    profiler = profiler or RenderProfiler()
 
-    output_ims = []
+    num_cameras = len(cameras)
 
+    start = time.perf_counter()
     with torch.no_grad():
-        for i in range(len(cameras)):
-            output_ims.append(pipeline.model.get_outputs(cameras[i])["rgb"].cpu())
+        for chunk_start in range(0, num_cameras, batch_size):
+            chunk = cameras[chunk_start:chunk_start + batch_size]
+            outputs = []
+            for i in range(len(chunk)):
+                # get_outputs only queues GPU work, so this mostly times the launch; the sync lands in transfer
+                with profiler.stage("render", frame=chunk_start + i):
+                    camera_outputs = pipeline.model.get_outputs(chunk[i:i + 1])
+                outputs.append({name: camera_outputs[name] for name in output_names})
+
+            with profiler.stage("transfer", frame=chunk_start):
+                stacked = {name: torch.stack([o[name] for o in outputs]).cpu() for name in output_names}
+            for i in range(len(outputs)):
+                yield {name: stacked[name][i] for name in output_names}
+    elapsed = time.perf_counter() - start
+
+    print(f"rendered {num_cameras} imgs in {elapsed:.2f}s ({num_cameras / max(elapsed, 1e-9):.2f} imgs/sec, batch_size={batch_size})")
+
+
+def iter_outputs(config: str, camera_poses: str, output_names: Tuple[str, ...] = ("rgb",), batch_size: int = 16,
+                 device: Optional[str] = None, profiler: Optional[RenderProfiler] = None, model_space: bool = False):
+    """
+    Loads the model in config and renders every pose in camera_poses, see render_cameras.
+    """
+    profiler = profiler or RenderProfiler()
+
+    with profiler.stage("setup"):
+        pipeline, cameras = _setup(config, camera_poses, device, model_space)
+
+    yield from render_cameras(pipeline, cameras, output_names, batch_size, profiler)
 
-    return output_ims
 
-def render_and_save_depth_imgs(config: str, camera_poses: str, output_dir: str):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+def iter_depth_imgs(config: str, camera_poses: str, batch_size: int = 16, device: Optional[str] = None,
+                    output_name: str = "rgb", model_space: bool = False):
+    for outputs in iter_outputs(config, camera_poses, (output_name,), batch_size, device, model_space=model_space):
+        yield outputs[output_name]
 
-    imgs = render_depth_imgs(config, camera_poses)
 
-    print(f"saving {len(imgs)} imgs to {output_dir}")
+def render_depth_imgs(config: str, camera_poses: str, batch_size: int = 16, device: Optional[str] = None,
+                      output_name: str = "rgb", model_space: bool = False):
+    return list(iter_depth_imgs(config, camera_poses, batch_size, device, output_name, model_space))
 
-    for i, img in enumerate(imgs):
-        img_path = os.path.join(output_dir, f"img_{i}.png")
-        plt.imsave(img_path, img.numpy())
+def render_and_save_depth_imgs(config: str, camera_poses: str, output_dir: str, batch_size: int = 16,
+                               device: Optional[str] = None, fmt: str = "png", num_threads: int = 4,
+                               outputs: Tuple[str, ...] = ("rgb", "depth", "accumulation"),
+                               depth_format: Literal["npy16", "png16"] = "npy16", report: Optional[str] = None,
+                               model_space: bool = False):
+    """
+    Streams rendered outputs straight into a background ImageWriter, so only the
+    current chunk and a few queued frames are held in memory.
+
+    rgb is written as img_{i}.{fmt}, depth / accumulation as {name}_{i} in
+    depth_format, with the encoding recorded in depth_meta.json. Use
+    depth_io.load_depth_dir to memory-map them back as one array.
+
+    report: if set, write per-stage timings to {report}.json / {report}.csv
+    model_space: camera_poses are already in the model's normalized space,
+        otherwise they're render_dir world space and mapped like novel_views does
+    """
+    print(f"saving imgs to {output_dir}")
+
+    maps = [name for name in outputs if name != "rgb"]
+    profiler = RenderProfiler()
+
+    writer = ImageWriter(output_dir, fmt=fmt, num_threads=num_threads, max_pending=2 * batch_size * len(outputs),
+                         profiler=profiler)
+    # closed on errors too, so the writer threads don't outlive a failed render
+    try:
+        for i, frame in enumerate(iter_outputs(config, camera_poses, outputs, batch_size, device, profiler,
+                                               model_space)):
+            # time spent here is back-pressure from the writer threads
+            with profiler.stage("queue", frame=i):
+                if "rgb" in frame:
+                    writer.put(f"img_{i}", frame["rgb"])
+                for name in maps:
+                    if depth_format == "png16":
+                        writer.put(f"{name}_{i}", frame[name], fmt=depth_format, scale=PNG_SCALES.get(name, DEPTH_PNG_SCALE))
+                    else:
+                        writer.put(f"{name}_{i}", frame[name], fmt=depth_format)
+    finally:
+        with profiler.stage("write_flush"):
+            writer.close()
+
+    for name in maps:
+        save_meta(output_dir, name, depth_format, PNG_SCALES.get(name, DEPTH_PNG_SCALE) if depth_format == "png16" else None)
+
+    print(f"saved {writer.num_written} imgs to {output_dir}")
+
+    if report is not None:
+        profiler.write_report(report)
     
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     config_path = "outputs/glass_400/splatfacto/2024-02-26_222509/config.yml"
     camera_poses = "test_poses.json"
     output_dir = "test_render_depth"
 
-    depth_ims = render_depth_imgs(config_path, camera_poses)
+    # test_poses.json is already in the model's normalized space
+    depth_ims = render_depth_imgs(config_path, camera_poses, model_space=True)
 
     plt.imshow(depth_ims[1])
     plt.show()
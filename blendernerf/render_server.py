@@ -0,0 +1,104 @@
+"""
+Long-lived render server. Models stay loaded in the pipeline cache between
+requests, so only the first request for a model pays the load cost.
+
+Requests are JSON, one per line, on stdin or a local TCP socket:
+
+    {"config": "outputs/bunny/splatfacto/<run>/config.yml",
+     "poses": "test_poses.json",            # pose file path or transforms dict
+     "output": "renders/bunny_test",
+     "model_space": true, "video": false, "batch_size": 16}
+
+("model_space": true because test_poses.json is already in the model's
+normalized space; leave it false for render_dir world space poses.)
+
+and each gets one JSON line back:
+
+    {"ok": true, "num_frames": 36, "seconds": 1.9, "cache_hits": 3, "cache_misses": 1}
+
+    python render_server.py                 # stdin / stdout
+    python render_server.py --port 5555     # 127.0.0.1:5555
+"""
+import sys
+import json
+import contextlib
+import time
+import argparse
+import threading
+import socketserver
+
+from novel_views import NovelViewRenderer
+from pipeline_cache import get_cache, get_pipeline
+
+RENDER_KWARGS = ("model_space", "batch_size", "output_name", "video", "fps")
+
+# one GPU, one render at a time, whichever client the request came from
+_render_lock = threading.Lock()
+
+
+def handle_request(request: dict, device=None):
+    start = time.perf_counter()
+    try:
+        # progress prints go to stderr so stdout only carries responses
+        with _render_lock, contextlib.redirect_stdout(sys.stderr):
+            pipeline = get_pipeline(request["config"], device)
+            renderer = NovelViewRenderer(request["config"], pipeline=pipeline)
+            kwargs = {k: request[k] for k in RENDER_KWARGS if k in request}
+            num_frames = renderer.render(request["poses"], request["output"], **kwargs)
+        response = {'ok': True, 'num_frames': num_frames}
+    except Exception as e:
+        response = {'ok': False, 'error': repr(e)}
+
+    cache = get_cache()
+    response.update({
+        'seconds': time.perf_counter() - start,
+        'cache_hits': cache.hits,
+        'cache_misses': cache.misses,
+    })
+    return response
+
+
+def handle_line(line: str, device=None):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {'ok': False, 'error': f"bad request: {e}"}
+    return handle_request(request, device)
+
+
+def serve_stdin(device=None):
+    for line in sys.stdin:
+        response = handle_line(line, device)
+        if response is not None:
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+
+
+def serve_socket(port: int, device=None):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                response = handle_line(line.decode(), device)
+                if response is not None:
+                    self.wfile.write((json.dumps(response) + "\n").encode())
+                    self.wfile.flush()
+
+    # loopback only, this server reads and writes arbitrary paths for whoever connects
+    with socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler) as server:
+        print(f"render server listening on 127.0.0.1:{port}", file=sys.stderr)
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=None, help="serve on 127.0.0.1:PORT instead of stdin")
+    parser.add_argument("--device", default=None, help="move pipelines to this device, e.g. cpu")
+    args = parser.parse_args()
+
+    if args.port is None:
+        serve_stdin(args.device)
+    else:
+        serve_socket(args.port, args.device)
@@ -1,16 +1,23 @@
 import bpy
+import os
 import math
 import numpy as np
-
-def make_camera(xyz: tuple = (5, 0, 5), rots: tuple = (45, 0, 90), FOV: int =120):
-
+from mathutils import Matrix
+from depth_io import DEPTH_PNG_SCALE, write_png16
+
+def make_camera(xyz: tuple = (5, 0, 5), rots: tuple = (45, 0, 90), FOV: int =120, track: bool = True):
+    """
+    track: add a TRACK_TO constraint on the active object. Leave it off for
+        cameras posed with set_camera_pose, whose matrices already look at the target.
+    """
     new_cam_data = bpy.data.cameras.new(name="new_cam")
     new_cam_data.angle = math.radians(FOV)  #50 mm focal length
 
     new_cam = bpy.data.objects.new(name="new_cam", object_data = new_cam_data)
 
-    cons = new_cam.constraints.new(type='TRACK_TO')
-    cons.target = bpy.context.active_object
+    if track:
+        cons = new_cam.constraints.new(type='TRACK_TO')
+        cons.target = bpy.context.active_object
 
     new_cam.location = xyz
     new_cam.rotation_euler = (math.radians(rots[0]), 0, math.radians(rots[2]))
@@ -19,7 +26,14 @@ def make_camera(xyz: tuple = (5, 0, 5), rots: tuple = (45, 0, 90), FOV: int =120
 
     return new_cam
 
-import bpy
+def set_camera_pose(camera, c2w):
+    """
+    Sets a camera-to-world matrix (e.g. from poses.look_at, which matches
+    TRACK_TO with -Z tracking and Y up) directly. matrix_world is correct as
+    soon as it's assigned, with no depsgraph update needed before rendering
+    or reading it back.
+    """
+    camera.matrix_world = Matrix(np.asarray(c2w, dtype=np.float64).tolist())
 
 def get_solid_material():
     solid_material = bpy.data.materials.new(name="SolidMaterial")
@@ -126,27 +140,170 @@ def add_background_noise():
     tree.links.new(noise_node.outputs[0], mix_node.inputs[2])
     tree.links.new(mix_node.outputs[0], composite_node.inputs['Image'])
 
-def get_rot_matrix(angle, axis):
-    cos, sin = math.cos, math.sin
-    if axis == 'Z':
-        rot_matrix = np.array([
-            [cos(angle), -sin(angle), 0],
-            [sin(angle), cos(angle), 0],
-            [0, 0, 1]
-            ])
-    elif axis == 'Y':
-        rot_matrix = np.array([
-            [cos(angle), 0, sin(angle)],
-            [0, 1, 0],
-            [-sin(angle), 0, -cos(angle)]
-            ])
-    elif axis == 'X':
-        rot_matrix = np.array([
-            [1, 0, 0],
-            [0, cos(angle), -sin(angle)],
-            [0, sin(angle), cos(angle)]
-            ])
-    else:
-        raise AssertionError("axis must be 'X', 'Y', or 'Z'")
-
-    return rot_matrix
+# render pass -> (subdirectory of the mesh output dir, file extension)
+# the depth EXR is kept as depth_exr_path, depth_file_path is its 16 bit PNG copy (write_depth_png)
+PASS_OUTPUTS = {
+    'depth': ("depth", ".exr"),
+    'normal': ("normals", ".exr"),
+    'mask': ("masks", ".png"),
+}
+
+def add_render_passes(pass_index: int = 1):
+    """
+    Enables the Z, normal and object index passes and adds File Output nodes
+    for them to the existing compositor graph (the composite RGB is left as
+    it is), so every render also writes its depth, normals and the object
+    mask of pass_index.
+
+    returns {pass name: File Output node}, see set_pass_paths
+    """
+    scene = bpy.context.scene
+    view_layer = bpy.context.view_layer
+    view_layer.use_pass_z = True
+    view_layer.use_pass_normal = True
+    view_layer.use_pass_object_index = True
+
+    scene.use_nodes = True
+    tree = scene.node_tree
+
+    render_layers = next((node for node in tree.nodes if node.type == 'R_LAYERS'), None)
+    if render_layers is None:
+        render_layers = tree.nodes.new('CompositorNodeRLayers')
+    if not any(node.type == 'COMPOSITE' for node in tree.nodes):
+        composite_node = tree.nodes.new('CompositorNodeComposite')
+        tree.links.new(render_layers.outputs['Image'], composite_node.inputs['Image'])
+
+    def file_output(name, file_format, color_mode, color_depth, location):
+        node = tree.nodes.new('CompositorNodeOutputFile')
+        node.name = node.label = f"{name}_output"
+        node.location = location
+        node.format.file_format = file_format
+        node.format.color_mode = color_mode
+        node.format.color_depth = color_depth
+        return node
+
+    # depth stays 32 bit float, in scene units along the camera axis
+    depth_node = file_output("depth", 'OPEN_EXR', 'BW', '32', (600, -200))
+    tree.links.new(render_layers.outputs['Depth'], depth_node.inputs[0])
+
+    normal_node = file_output("normal", 'OPEN_EXR', 'RGB', '16', (600, -400))
+    tree.links.new(render_layers.outputs['Normal'], normal_node.inputs[0])
+
+    id_mask_node = tree.nodes.new('CompositorNodeIDMask')
+    id_mask_node.index = pass_index
+    id_mask_node.use_antialiasing = True
+    id_mask_node.location = (300, -600)
+    tree.links.new(render_layers.outputs['IndexOB'], id_mask_node.inputs['ID value'])
+
+    mask_node = file_output("mask", 'PNG', 'BW', '8', (600, -600))
+    tree.links.new(id_mask_node.outputs['Alpha'], mask_node.inputs[0])
+
+    return {'depth': depth_node, 'normal': normal_node, 'mask': mask_node}
+
+def set_pass_paths(pass_nodes: dict, mesh_output_dir: str, name: str):
+    """
+    Points the File Output nodes at {mesh_output_dir}/{subdir}/ for the view
+    about to be rendered. returns the transforms.json keys for its pass files,
+    relative to mesh_output_dir.
+    """
+    # File Output always appends the frame number to the slot path
+    frame = bpy.context.scene.frame_current
+    keys = {'depth': 'depth_exr_path', 'normal': 'normal_path', 'mask': 'mask_path'}
+
+    paths = {}
+    for pass_name, node in pass_nodes.items():
+        subdir, ext = PASS_OUTPUTS[pass_name]
+        node.base_path = os.path.join(mesh_output_dir, subdir)
+        node.file_slots[0].path = f"{name}_"
+        paths[keys[pass_name]] = f"{subdir}/{name}_{frame:04d}{ext}"
+        if pass_name == 'depth':
+            paths['depth_file_path'] = f"{subdir}/{name}_{frame:04d}.png"
+
+    return paths
+
+def write_depth_png(exr_path, png_path, scale: float = DEPTH_PNG_SCALE):
+    """
+    16 bit PNG copy of a Z pass EXR in scene units * scale, i.e. millimetres
+    for the default 1000, which is what nerfstudio's depth_file_path reader
+    (depth_unit_scale_factor=1e-3) expects without OpenEXR support in OpenCV.
+    Background and depths past the 16 bit range are written as 0, no depth.
+    """
+    # rows come back bottom-up, as Blender stores them
+    depth = load_image_pixels(exr_path)[::-1, :, 0]
+    depth = np.where(depth * scale <= 65535, depth, 0)
+    write_png16(png_path, depth, scale)
+
+def file_outputs_muted(mute: bool):
+    """
+    Mutes (or unmutes) every compositor File Output node, returns their previous states
+    """
+    scene = bpy.context.scene
+    if not scene.use_nodes:
+        return {}
+    states = {}
+    for node in scene.node_tree.nodes:
+        if node.type == 'OUTPUT_FILE':
+            states[node.name] = node.mute
+            node.mute = mute
+    return states
+
+def add_mesh_object(verts, faces, name="mesh"):
+    """
+    Builds a triangle mesh object straight from (V, 3) verts and (F, 3) faces
+    with the foreach_set bulk API, instead of bpy.ops.import_mesh.stl.
+    """
+    verts = np.asarray(verts, dtype=np.float32)
+    faces = np.asarray(faces, dtype=np.int32)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set("co", verts.ravel())
+
+    mesh.loops.add(faces.size)
+    mesh.loops.foreach_set("vertex_index", faces.ravel())
+
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, faces.size, 3, dtype=np.int32))
+    # loop_total is derived from loop_start and read-only since Blender 4.0
+    if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", np.full(len(faces), 3, dtype=np.int32))
+
+    mesh.update()
+    mesh.validate()
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(obj)
+    bpy.context.view_layer.objects.active = obj
+
+    return obj
+
+def datablock_counts():
+    """
+    Number of datablocks of each kind in bpy.data, to spot leaks across a batch.
+    """
+    kinds = ("objects", "meshes", "materials", "cameras", "lights", "images", "textures", "node_groups")
+    return {kind: len(getattr(bpy.data, kind)) for kind in kinds}
+
+def load_image_pixels(filepath):
+    """
+    Reads an image file into a (H, W, 4) float32 array. Rows are bottom-up, as Blender stores them.
+    """
+    img = bpy.data.images.load(filepath)
+    width, height = img.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    img.pixels.foreach_get(pixels)
+    bpy.data.images.remove(img)
+
+    return pixels.reshape(height, width, 4)
+
+def save_image_pixels(filepath, pixels):
+    """
+    Writes a (H, W, 4) bottom-up float array (as from load_image_pixels) to a PNG.
+    """
+    height, width = pixels.shape[:2]
+    img = bpy.data.images.new("tmp_save", width=width, height=height, alpha=True)
+    img.pixels.foreach_set(np.ascontiguousarray(pixels, dtype=np.float32).ravel())
+    img.filepath_raw = filepath
+    img.file_format = 'PNG'
+    img.save()
+    bpy.data.images.remove(img)
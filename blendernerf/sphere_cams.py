@@ -1,16 +1,26 @@
 import bpy
+import os
+import json
 import pathlib
 import math
+import time
+import itertools
 import numpy as np
-import multiprocessing
 from scene_utils import *
-from get_camera_info import get_camera_extrinsics, get_camera_intrinsics, save_json 
+from get_camera_info import get_camera_intrinsics, save_json
+from poses import orbit_poses, sample_poses, validate_poses
+from manifest import SAVE_EVERY, RenderManifest, file_hash, settings_hash
+from mesh_cache import TARGET_SIZE, load_normalized_mesh
+from profiling import RenderProfiler
+from pyramid import export_pyramid
+from pose_store import load_transforms, save_pose_store
+from adaptive import estimate_tile_noise, noisy_region, next_samples, region_tiles
 
 def add_sphere_world():
     prev_active = bpy.context.view_layer.objects.active
     bpy.ops.object.select_all(action='DESELECT')
     bpy.ops.mesh.primitive_uv_sphere_add(radius=50, location=(0, 0, 0))
-
+    sphere = bpy.context.object
 
     # Create a new material
     mat = bpy.data.materials.new(name="sphere_material")
@@ -49,20 +59,13 @@ def add_sphere_world():
 
     #sphere_material.use_backface_culling = True
     # Apply the material to the sphere
-    bpy.context.object.data.materials.append(mat)
+    sphere.data.materials.append(mat)
 
     bpy.context.view_layer.objects.active = prev_active
 
-def rotate_camera(camera_obj, origin, angle: float, axis: str = 'Z'):
-    cos = math.cos
-    sin = math.sin
-
-    rot_matrix = get_rot_matrix(angle, axis)
-
-    camera_obj.location = np.dot(origin, rot_matrix)
+    return sphere
 
-
-def render_dir(mesh_dir: str, output_dir: str, rot_res: int = 4):
+def setup_scene():
     bpy.context.scene.render.engine = 'CYCLES'
 
     bpy.context.scene.render.resolution_x = 512
@@ -74,16 +77,10 @@ def render_dir(mesh_dir: str, output_dir: str, rot_res: int = 4):
 
     use_gpu("CUDA")
 
-    path_name = mesh_dir
-    image_path_name = output_dir
-     
-    stl_root = pathlib.Path(path_name)
-     
     bpy.ops.object.select_all(action='SELECT')
     bpy.ops.object.delete()  #Delete defualt cube
 
     bpy.ops.object.select_all(action='DESELECT')
-    render = bpy.context.scene.render
 
     #add_background_noise()
     #glass_material = get_glass_material()
@@ -98,74 +95,516 @@ def render_dir(mesh_dir: str, output_dir: str, rot_res: int = 4):
     collection.objects.link(light2)
     bpy.ops.object.select_all(action='DESELECT')
 
-    FOV = 90
+    return glass_material
+
+
+def render_settings(scene, material, FOV, max_faces=None, adaptive=None, passes=False):
+    """
+    Everything besides the STL and the pose that changes what a view looks like.
+    """
+    render = scene.render
+    return {
+        'engine': render.engine,
+        'resolution': [render.resolution_x, render.resolution_y, render.resolution_percentage],
+        'pixel_aspect': [render.pixel_aspect_x, render.pixel_aspect_y],
+        'samples': scene.cycles.samples,
+        'FOV': FOV,
+        'material': material.name,
+        'mesh_size': TARGET_SIZE,
+        'max_faces': max_faces,
+        'adaptive': adaptive,
+        'film_transparent': render.film_transparent,
+        'passes': passes,
+    }
+
+
+class SceneTemplate:
+    """
+    Lights, material, sky sphere and camera, built once per process. Only the
+    target mesh is swapped between renders, so bpy.data doesn't grow with the
+    number of meshes rendered.
+    """
+    # purge orphaned datablocks every this many meshes
+    PURGE_EVERY = 50
+    # object index of the target mesh, for the mask pass
+    MESH_PASS_INDEX = 1
+
+    def __init__(self):
+        self.material = setup_scene()
+
+        # no TRACK_TO: every view sets an analytic look-at matrix (poses.look_at) instead,
+        # so the pose saved for a frame is exactly the one it was rendered with
+        self.camera = make_camera(xyz = (math.sqrt(30), 0, 0), rots = (90, 0, 90), track=False)
+        bpy.context.scene.camera = self.camera
 
-     
-    for stl_fname in stl_root.glob('**/*.stl'):
-        bpy.ops.import_mesh.stl(filepath=str(stl_fname))
-        obj = bpy.context.active_object
-        obj.data.materials.append(glass_material)
+        bpy.ops.object.select_all(action='DESELECT')
+        #bpy.ops.mesh.primitive_plane_add(size=100, enter_editmode=False, align='WORLD', location=(0, 0, -10))
+        self.sky_sphere = add_sphere_world()
+
+        self.mesh_obj = None
+        self.num_swaps = 0
+        self.pass_outputs = None
+
+    def clear_mesh(self):
+        if self.mesh_obj is None:
+            return
+        mesh = self.mesh_obj.data
+        bpy.data.objects.remove(self.mesh_obj, do_unlink=True)
+        bpy.data.meshes.remove(mesh)
+        self.mesh_obj = None
+
+    def swap_mesh(self, verts, faces, name="mesh"):
+        self.clear_mesh()
+
+        self.mesh_obj = add_mesh_object(verts, faces, name=name)
+        self.mesh_obj.data.materials.append(self.material)
+        self.mesh_obj.display.show_shadows = False
+        self.mesh_obj.pass_index = self.MESH_PASS_INDEX
+
+        self.num_swaps += 1
+        if self.num_swaps % self.PURGE_EVERY == 0:
+            self.purge_orphans()
+
+        return self.mesh_obj
+
+    def set_transparent(self, transparent: bool):
+        """
+        Transparent film with the sky sphere hidden from camera rays (it still
+        lights the scene), so the PNG alpha is the object's foreground mask.
+        """
+        render = bpy.context.scene.render
+        render.film_transparent = transparent
+        render.image_settings.color_mode = 'RGBA' if transparent else 'RGB'
+        self.sky_sphere.visible_camera = not transparent
+
+    def set_passes(self, enabled: bool):
+        """
+        Depth / normal / mask File Output nodes, added to the compositor the
+        first time they're enabled and muted while disabled.
+        """
+        if enabled and self.pass_outputs is None:
+            self.pass_outputs = add_render_passes(self.MESH_PASS_INDEX)
+        for node in (self.pass_outputs or {}).values():
+            node.mute = not enabled
+
+    def set_fov(self, FOV):
         #camera.data.anlge is FOV in radians
-        obj.display.show_shadows = False
+        self.camera.data.angle = math.radians(FOV)
+
+    def purge_orphans(self):
+        """
+        Removes datablocks nothing uses any more (mesh data, images loaded by
+        the compositor, ...), which otherwise pile up over a long batch.
+        """
+        if hasattr(bpy.data, "orphans_purge"):
+            bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+            return
+        for collection in (bpy.data.meshes, bpy.data.materials, bpy.data.images, bpy.data.textures):
+            for block in list(collection):
+                if block.users == 0:
+                    collection.remove(block)
+
+
+def _render_pixels(filepath, seed: int, region=None, write_passes: bool = False):
+    """
+    Renders with the given Cycles seed and returns the (H, W, 4) pixels, or
+    only those of the pixel box region = (x0, y0, x1, y1) (rows bottom-up)
+    if given, as a border render. The pass File Outputs only write if
+    write_passes, so extra renders never overwrite the full-frame passes.
+    """
+    scene = bpy.context.scene
+    render = scene.render
+    scene.cycles.seed = seed
+
+    if region is not None:
+        scale = render.resolution_percentage / 100
+        width, height = int(render.resolution_x * scale), int(render.resolution_y * scale)
+        x0, y0, x1, y1 = region
+        # one pixel of margin so Cycles' rounding of the border never drops an edge row
+        render.use_border = True
+        render.use_crop_to_border = False
+        render.border_min_x, render.border_max_x = max(x0 - 1, 0) / width, min(x1 + 1, width) / width
+        render.border_min_y, render.border_max_y = max(y0 - 1, 0) / height, min(y1 + 1, height) / height
+
+    tmp_path = f"{filepath}.seed{seed}.png"
+    pass_states = {} if write_passes else file_outputs_muted(True)
+    try:
+        bpy.ops.render.render()
+        bpy.data.images['Render Result'].save_render(filepath=tmp_path)
+        pixels = load_image_pixels(tmp_path)
+    finally:
+        render.use_border = False
+        for node_name, muted in pass_states.items():
+            scene.node_tree.nodes[node_name].mute = muted
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    if region is None:
+        return pixels
+    return pixels[y0:y1, x0:x1]
+
+
+def render_view(filepath: str, profiler: RenderProfiler, mesh: str, name: str, noise_threshold: float = None,
+                min_samples: int = 16, max_samples: int = 256, tile_size: int = 32):
+    """
+    Renders the current camera view to filepath.
+
+    With noise_threshold set, the view is rendered as two independent renders
+    of min_samples / 2 each, averaged, and their difference gives the noise
+    per tile (see adaptive.py). Only the tiles above noise_threshold are
+    re-rendered (as a render border, again as two halves) with more samples,
+    up to max_samples.
+
+    returns {'samples': ...} for the view's transforms.json frame, in adaptive
+    mode the most samples any tile got, plus 'mean_samples' over the tiles and 'noise'
+    """
+    cycles = bpy.context.scene.cycles
+
+    if noise_threshold is None:
+        with profiler.stage("render", mesh, name):
+            bpy.ops.render.render()
+        with profiler.stage("png_write", mesh, name):
+            bpy.data.images['Render Result'].save_render(filepath=filepath)
+        return {'samples': cycles.samples}
+
+    base_samples, base_seed = cycles.samples, cycles.seed
+    # a fresh seed per render, so every half is independent of all earlier ones
+    seeds = itertools.count(base_seed + 1)
+    samples = max(2, min_samples)
+    cycles.samples = samples // 2
+
+    try:
+        with profiler.stage("render", mesh, name):
+            half_a = _render_pixels(filepath, next(seeds), write_passes=True)
+            half_b = _render_pixels(filepath, next(seeds))
+
+        with profiler.stage("noise_estimate", mesh, name):
+            tile_noise = estimate_tile_noise(half_a, half_b, tile_size)
+        tile_samples = np.full(tile_noise.shape, 2 * (samples // 2))
+
+        while samples < max_samples:
+            region = noisy_region(tile_noise, noise_threshold, tile_size)
+            if region is None:
+                break
+
+            samples = next_samples(samples, float(tile_noise.max()), noise_threshold, max_samples)
+            cycles.samples = max(1, samples // 2)
+
+            x0, y0, x1, y1 = region
+            with profiler.stage("rerender", mesh, name):
+                half_a[y0:y1, x0:x1] = _render_pixels(filepath, next(seeds), region)
+                half_b[y0:y1, x0:x1] = _render_pixels(filepath, next(seeds), region)
+            tile_samples[region_tiles(region, tile_size)] = 2 * cycles.samples
+
+            with profiler.stage("noise_estimate", mesh, name):
+                tile_noise = estimate_tile_noise(half_a, half_b, tile_size)
+
+        with profiler.stage("png_write", mesh, name):
+            save_image_pixels(filepath, (half_a + half_b) / 2)
+    finally:
+        cycles.samples, cycles.seed = base_samples, base_seed
+
+    return {'samples': int(tile_samples.max()), 'mean_samples': float(tile_samples.mean()),
+            'noise': float(tile_noise.max())}
+
+
+def _finish_mesh(mesh, mesh_output_dir, transforms, template, FOV, pyramid, profiler):
+    with profiler.stage("json_write", mesh):
+        save_json(transforms, f"{mesh_output_dir}/transforms.json")
+        save_pose_store(f"{mesh_output_dir}/poses.npz", transforms)
+
+    if pyramid:
+        template.set_fov(FOV)
+        level_intrinsics = {f: get_camera_intrinsics(bpy.context.scene, template.camera, downscale=f) for f in pyramid}
+        with profiler.stage("pyramid", mesh):
+            export_pyramid(mesh_output_dir, transforms, level_intrinsics)
+
+
+def render_mesh(stl_fname, output_dir: str, rot_res: int, template: SceneTemplate, FOV: int = 90,
+                cache_dir: str = None, max_faces: int = None, profiler: RenderProfiler = None,
+                adaptive: dict = None, pyramid: tuple = (), sampler: str = "grid", sampler_kwargs: dict = None,
+                transparent: bool = False, pose_file: str = None, passes: bool = False):
+    """
+    cache_dir: where preprocessed meshes are cached, defaults to {output_dir}/mesh_cache
+    max_faces: decimate meshes with more faces than this before rendering
+    profiler: collects per-stage timings for this mesh if given
+    adaptive: render_view kwargs for adaptive sampling, e.g. {'noise_threshold': .01, 'max_samples': 256}.
+        The most samples any tile got is recorded per frame in transforms.json
+        as samples, the mean over tiles as mean_samples.
+    pyramid: downsampling factors, e.g. (2, 4), exported to images_{f}/ + transforms_{f}.json from the same render
+    sampler: "grid" for the rot_res x rot_res lat/long orbit, or one of poses.SAMPLERS
+        ("fibonacci", "hammersley", "stratified") with sampler_kwargs for poses.sample_poses,
+        e.g. {'num_views': 24, 'upper_hemisphere': True, 'seed': 0, 'radius': (5, 6)}
+    transparent: render RGBA without the sky sphere in view, for masks from postprocess.py
+    pose_file: render exactly these poses (transforms.json or pose store .npz, e.g. from
+        view_planning.py) instead of sampling; "{mesh}" is replaced by the STL stem
+    passes: also write depth (depth/*.exr), normals (normals/*.exr) and the object
+        mask (masks/*.png) from the same render, registered per frame as
+        depth_exr_path, normal_path and mask_path. depth_file_path is a 16 bit
+        PNG of the depth in millimetres (scene units * 1000), readable by
+        nerfstudio's depth models with their default depth_unit_scale_factor
+    """
+    scene = bpy.context.scene
+    render = scene.render
+    mesh = stl_fname.stem
+    mesh_output_dir = f"{output_dir}/{mesh}"
+    cache_dir = cache_dir or os.path.join(output_dir, "mesh_cache")
+    profiler = profiler or RenderProfiler()
+
+    camera_origin = np.array([math.sqrt(30), 0, 0])
+
+    # every pose is computed and checked up front, the loop below only moves the camera and renders
+    with profiler.stage("poses", mesh):
+        if pose_file is not None:
+            frames = load_transforms(pose_file.format(mesh=mesh))["frames"]
+            c2w = np.array([frame["transform_matrix"] for frame in frames], dtype=np.float64)
+            names = [pathlib.Path(frame["file_path"]).stem for frame in frames]
+        elif sampler == "grid":
+            c2w, names = orbit_poses(rot_res, radius=np.linalg.norm(camera_origin))
+        else:
+            sampler_kwargs = {'radius': np.linalg.norm(camera_origin), **(sampler_kwargs or {})}
+            c2w, names = sample_poses(sampler, **sampler_kwargs)
+        validate_poses(c2w)
+
+    template.set_transparent(transparent)
+    template.set_passes(passes)
+
+    with profiler.stage("manifest", mesh):
+        stl_hash = file_hash(stl_fname)
+        manifest = RenderManifest.load(mesh_output_dir, stl_hash,
+                                       settings_hash(render_settings(scene, template.material, FOV, max_faces, adaptive, passes)))
+        todo = manifest.missing(c2w, names)
+
+    if not todo and manifest.intrinsics is not None:
+        print(f"{mesh}: all {len(names)} views up to date, skipping")
+        _finish_mesh(mesh, mesh_output_dir, manifest.transforms(names), template, FOV, pyramid, profiler)
+        return
+
+    # parsed, centered on the origin and scaled to TARGET_SIZE once, then cached by STL hash
+    with profiler.stage("mesh_load", mesh):
+        verts, faces = load_normalized_mesh(stl_fname, cache_dir, max_faces=max_faces, stl_hash=stl_hash)
+
+    with profiler.stage("scene_setup", mesh):
+        template.swap_mesh(verts, faces, name=mesh)
 
-        max_dim = max(obj.dimensions)
-        obj.scale *= 7 / max_dim
         #scale_factor =  (2*(math.sqrt(30))*math.atan(math.radians(FOV)) / (max_dim))
         #obj.scale *= scale_factor
 
-
-        #z_dim = obj.dimensions[2]
-        #z_min = get_min_z(obj)
-
-        # Try and move the object to the origin
-        bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN')
-        bpy.ops.object.location = (0, 0, 0)
-
-
-        camera_origin = np.array([math.sqrt(30), 0, 0])
-        camera = make_camera(xyz = camera_origin, rots = (90, 0, 90), FOV=FOV)
-        bpy.context.scene.camera = camera
-
-        bpy.ops.object.select_all(action='DESELECT')
-        #bpy.ops.mesh.primitive_plane_add(size=100, enter_editmode=False, align='WORLD', location=(0, 0, -10))
-        add_sphere_world()
-
-        rotz_incr, roty_incr = (2 * math.pi) / rot_res, (2 * math.pi / 2) / rot_res
-        roty, rotz = -rot_res / 2 * roty_incr, 0
-        #roty, rotz = 0, 0
-
-        scene = bpy.context.scene
-
-        intrinsics_dict = get_camera_intrinsics(scene, camera)
-
-        extrinsics_dicts = []
-
-
-        for i in range(0, rot_res):
-            rotz = 0
-            for j in range(0, rot_res):
-                render.filepath = f"{output_dir}/{stl_fname.stem}/{rotz:.2f}_{roty:.2f}"
-                bpy.ops.render.render(write_still = True)
-
-                rotate_camera(camera, camera_origin, 0, "Z")
-                rotate_camera(camera, camera_origin, roty, "Y")
-                rotate_camera(camera, camera.location, rotz, "Z")
-                rotz += rotz_incr
-
-                extrinsics_dicts.append(get_camera_extrinsics(scene, camera, f"{render.filepath}.png", mode='TRAIN'))
-
-            roty += roty_incr
-
-        intrinsics_dict["frames"] = extrinsics_dicts
-        save_json(intrinsics_dict, f"{output_dir}/{stl_fname.stem}/transforms.json")
-
-
-        bpy.data.objects.remove(obj, do_unlink=True)
-
+        camera = template.camera
+        template.set_fov(FOV)
+
+        manifest.intrinsics = get_camera_intrinsics(scene, camera)
+
+    # the manifest is rewritten every SAVE_EVERY views and once more however the loop ends,
+    # a crash costs at most that many re-renders instead of O(N^2) manifest writes per mesh
+    try:
+        for n, i in enumerate(todo):
+            set_camera_pose(camera, c2w[i])
+            render.filepath = f"{mesh_output_dir}/{names[i]}"
+            pass_paths = set_pass_paths(template.pass_outputs, os.path.abspath(mesh_output_dir), names[i]) if passes else {}
+
+            # render and save separately so Cycles time and PNG encode time show up as their own stages
+            view_info = render_view(f"{render.filepath}.png", profiler, mesh, names[i], **(adaptive or {}))
+            if passes:
+                with profiler.stage("depth_png", mesh, names[i]):
+                    write_depth_png(os.path.join(mesh_output_dir, pass_paths['depth_exr_path']),
+                                    os.path.join(mesh_output_dir, pass_paths['depth_file_path']))
+
+            with profiler.stage("json_write", mesh, names[i]):
+                manifest.record(names[i], c2w[i], f"{names[i]}.png", **view_info, **pass_paths)
+                if (n + 1) % SAVE_EVERY == 0:
+                    manifest.save()
+    finally:
+        with profiler.stage("json_write", mesh):
+            manifest.save()
+
+    _finish_mesh(mesh, mesh_output_dir, manifest.transforms(names), template, FOV, pyramid, profiler)
+
+    template.clear_mesh()
+    profiler.record_datablocks(mesh, datablock_counts())
+
+
+def render_stls(stl_fnames, output_dir: str, rot_res: int, template: SceneTemplate, profiler: RenderProfiler,
+                **render_kwargs):
+    """
+    Renders each mesh in turn and reports the outcome instead of raising,
+    so one bad STL doesn't take down the rest of the shard.
+    """
+    results = []
+    for stl_fname in stl_fnames:
+        start = time.perf_counter()
+        try:
+            render_mesh(pathlib.Path(stl_fname), output_dir, rot_res, template, profiler=profiler, **render_kwargs)
+            error = None
+        except Exception as e:
+            error = repr(e)
+
+        results.append({
+            'mesh': str(stl_fname),
+            'success': error is None,
+            'error': error,
+            'seconds': time.perf_counter() - start,
+            'pid': os.getpid(),
+        })
+
+    return results
+
+def _load_shard(shard, prefix, job_result, profiler):
+    """
+    per-mesh results a shard wrote, or a failure for each of its meshes if it died before writing them
+    """
+    if not os.path.exists(f"{prefix}_results.json"):
+        error = f"shard {job_result['status']}, see {job_result['log']}"
+        return [{'mesh': str(stl_fname), 'success': False, 'error': error, 'seconds': 0.0, 'pid': None}
+                for stl_fname in shard]
+
+    with open(f"{prefix}_results.json", 'r') as file:
+        results = json.load(file)
+    if profiler is not None and os.path.exists(f"{prefix}.json"):
+        with open(f"{prefix}.json", 'r') as file:
+            report = json.load(file)
+        profiler.merge(report['records'], report['datablocks'])
+    return results
+
+def render_dir_sharded(stl_fnames, output_dir: str, rot_res: int = 4, num_workers: int = 2,
+                       profiler: RenderProfiler = None, blender=None, devices=None, **render_kwargs):
+    """
+    Splits stl_fnames across num_workers Blender subprocesses, each running
+    this script on its subset (pipeline.render_command) with its own scene,
+    writing to {output_dir}/{stl stem}, the same layout as the serial run.
+    Returns one result dict per mesh, in input order. Shard logs, results and
+    timings go to {output_dir}/shards/, timings are merged into profiler if given.
+
+    blender: command prefix, defaults to the running Blender in background mode
+    devices: jobs.run_jobs slots the shards run in, e.g. ["0", "1"]; defaults to
+        jobs.visible_gpus, so shards keep the GPUs this process sees
+    """
+    from jobs import Job, run_jobs, visible_gpus
+    from pipeline import DEFAULT_PARAMS, render_command
+
+    blender = blender or [bpy.app.binary_path, "--background", "--python"]
+    params = {'rot_res': rot_res, **{k: v for k, v in render_kwargs.items() if k in DEFAULT_PARAMS['render']}}
+    # render_mesh options the command line has no flag for
+    extra = {k: v for k, v in render_kwargs.items() if k not in DEFAULT_PARAMS['render']}
+
+    shard_dir = os.path.join(output_dir, "shards")
+    os.makedirs(shard_dir, exist_ok=True)
+    shards = [shard for shard in (stl_fnames[i::num_workers] for i in range(num_workers)) if shard]
+
+    jobs, prefixes = [], []
+    for i, shard in enumerate(shards):
+        prefix = os.path.join(shard_dir, f"shard_{i}")
+        if os.path.exists(f"{prefix}_results.json"):
+            os.remove(f"{prefix}_results.json")
+
+        command = render_command(shard, output_dir, params, blender) + ["--results", f"{prefix}_results.json",
+                                                                        "--report", prefix]
+        if extra:
+            command += ["--render-kwargs", json.dumps(extra)]
+        jobs.append(Job(f"shard_{i}", command))
+        prefixes.append(prefix)
+
+    job_results = run_jobs(jobs, devices or visible_gpus(len(jobs)), log_dir=shard_dir)
+
+    results = []
+    for shard, prefix, job_result in zip(shards, prefixes, job_results):
+        results.extend(_load_shard(shard, prefix, job_result, profiler))
+
+    order = {str(stl_fname): i for i, stl_fname in enumerate(stl_fnames)}
+    results.sort(key=lambda r: order[r['mesh']])
+
+    save_json(results, os.path.join(output_dir, "render_results.json"))
+
+    failed = [r for r in results if not r['success']]
+    print(f"rendered {len(results) - len(failed)}/{len(results)} meshes, {len(failed)} failed")
+
+    return results
+
+
+def render_dir(mesh_dir: str, output_dir: str, rot_res: int = 4, num_workers: int = 1, report: str = None,
+               devices=None, **render_kwargs):
+    """
+    report: if set, write per-stage timings to {report}.json / {report}.csv
+    devices: GPU slots for the num_workers > 1 shards, see render_dir_sharded
+    render_kwargs are passed on to render_mesh (FOV, cache_dir, max_faces, ...)
+    """
+    path_name = mesh_dir
+    image_path_name = output_dir
+     
+    stl_root = pathlib.Path(path_name)
+    stl_fnames = sorted(stl_root.glob('**/*.stl'))
+
+    profiler = RenderProfiler()
+
+    if num_workers > 1:
+        results = render_dir_sharded(stl_fnames, output_dir, rot_res, num_workers, profiler, devices=devices,
+                                     **render_kwargs)
+    else:
+        results = None
+        with profiler.stage("scene_template"):
+            template = SceneTemplate()
+
+        for stl_fname in stl_fnames:
+            render_mesh(stl_fname, output_dir, rot_res, template, profiler=profiler, **render_kwargs)
+
+    if report is not None:
+        profiler.write_report(report)
+
+    return results
+
+
+
+def parse_args(argv):
+    """
+    Blender passes its own arguments through, the script's come after "--":
+        blender --background --python sphere_cams.py -- --stl ../mesh_dir/bunny.stl --rot-res 6
+    """
+    import argparse
+
+    argv = argv[argv.index("--") + 1:] if "--" in argv else []
+    parser = argparse.ArgumentParser(prog="sphere_cams.py")
+    parser.add_argument("--mesh-dir", default="../mesh_dir")
+    parser.add_argument("--stl", nargs="+", default=None, help="render these STLs instead of all of --mesh-dir")
+    parser.add_argument("--output", default="outputs")
+    parser.add_argument("--rot-res", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--devices", nargs="+", default=None,
+                        help="CUDA devices the --workers shards are spread over, default: the visible ones")
+    parser.add_argument("--fov", type=float, default=90)
+    parser.add_argument("--max-faces", type=int, default=None)
+    parser.add_argument("--sampler", default="grid")
+    parser.add_argument("--sampler-kwargs", type=json.loads, default=None, help="JSON, e.g. '{\"num_views\": 24}'")
+    parser.add_argument("--transparent", action="store_true")
+    parser.add_argument("--pose-file", default=None, help="poses to render, {mesh} is replaced by the STL stem")
+    parser.add_argument("--passes", action="store_true", help="also write depth, normal and mask passes")
+    parser.add_argument("--render-kwargs", type=json.loads, default=None,
+                        help="JSON, further render_mesh arguments, e.g. '{\"pyramid\": [2, 4]}'")
+    parser.add_argument("--results", default=None, help="write per-mesh results of --stl to this JSON file")
+    parser.add_argument("--report", default=None)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    mesh_dir = "../mesh_dir"
-    image_path_name = "outputs"
-    render_dir(mesh_dir, image_path_name, rot_res = 4)
-
+    import sys
+
+    args = parse_args(sys.argv)
+    render_kwargs = dict(FOV=args.fov, max_faces=args.max_faces, sampler=args.sampler,
+                         sampler_kwargs=args.sampler_kwargs, transparent=args.transparent,
+                         pose_file=args.pose_file, passes=args.passes, **(args.render_kwargs or {}))
+
+    if args.stl is None:
+        render_dir(args.mesh_dir, args.output, rot_res=args.rot_res, num_workers=args.workers,
+                   report=args.report, devices=args.devices, **render_kwargs)
+    else:
+        profiler = RenderProfiler()
+        template = SceneTemplate()
+        results = render_stls(args.stl, args.output, args.rot_res, template, profiler, **render_kwargs)
+
+        if args.results is not None:
+            save_json(results, args.results)
+        if args.report is not None:
+            profiler.write_report(args.report)
+        for result in results:
+            if not result['success']:
+                print(f"{result['mesh']}: FAILED {result['error']}")
+        sys.exit(0 if all(result['success'] for result in results) else 1)
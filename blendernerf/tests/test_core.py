@@ -0,0 +1,181 @@
+"""
+Tests for the modules that run without Blender or nerfstudio (NumPy only).
+
+    python -m pytest blendernerf/tests
+"""
+import os
+import sys
+import json
+import math
+
+import numpy as np
+import pytest
+
+# modules are imported flat, as the scripts in blendernerf/ do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptive import estimate_noise, estimate_tile_noise, next_samples, noisy_region
+from jobs import Job, run_jobs
+from manifest import RenderManifest, png_is_complete
+from mesh_cache import normalize, read_stl, weld
+from pose_store import load_pose_store, load_transforms, save_pose_store
+from poses import get_rot_matrix, look_at, orbit_angles, orbit_positions, orbit_poses, sample_poses, validate_poses
+from postprocess import aabb_scale, bounding_radius, mask_bbox
+
+
+def _rotate_camera_chain(origin, rotz, roty):
+    # what sphere_cams.rotate_camera did per frame, before orbit_positions
+    location = np.dot(origin, get_rot_matrix(roty, 'Y'))
+    return np.dot(location, get_rot_matrix(rotz, 'Z'))
+
+
+def test_orbit_positions_match_rotate_camera():
+    radius = math.sqrt(30)
+    rotz, roty = orbit_angles(5)
+    expected = np.array([_rotate_camera_chain(np.array([radius, 0, 0]), z, y) for z, y in zip(rotz, roty)])
+    np.testing.assert_allclose(orbit_positions(rotz, roty, radius), expected, atol=1e-12)
+
+
+def test_orbit_and_sampled_poses_are_rigid_and_look_at_origin():
+    for c2w in (orbit_poses(4)[0], sample_poses('fibonacci', 32)[0], sample_poses('stratified', 32, seed=0)[0]):
+        validate_poses(c2w)
+        # the camera looks down its -Z axis, at the origin
+        forward = -c2w[:, :3, 2]
+        to_target = -c2w[:, :3, 3] / np.linalg.norm(c2w[:, :3, 3], axis=-1, keepdims=True)
+        np.testing.assert_allclose(forward, to_target, atol=1e-9)
+
+
+def test_validate_poses_rejects_non_rigid():
+    c2w = look_at(np.array([[3.0, 0, 1]]))
+    c2w[0, :3, :3] *= 2
+    with pytest.raises(ValueError):
+        validate_poses(c2w)
+
+
+def _write_ascii_stl(path, triangles):
+    lines = ["solid test"]
+    for tri in triangles:
+        lines += ["facet normal 0 0 0", "outer loop"]
+        lines += [f"vertex {x!r} {y!r} {z!r}" for x, y, z in tri.tolist()]
+        lines += ["endloop", "endfacet"]
+    lines.append("endsolid test")
+    path.write_text("\n".join(lines))
+
+
+def _write_binary_stl(path, triangles):
+    # a header starting with "solid", which read_stl must not mistake for ASCII
+    header = b"solid binary".ljust(80, b" ")
+    records = bytearray()
+    for tri in triangles:
+        records += np.zeros(3, dtype='<f4').tobytes() + tri.astype('<f4').tobytes() + b"\0\0"
+    path.write_bytes(header + np.uint32(len(triangles)).tobytes() + bytes(records))
+
+
+def test_ascii_and_binary_stl_parse_to_the_same_mesh(tmp_path):
+    triangles = np.random.default_rng(0).random((20, 3, 3)).astype(np.float32)
+    _write_ascii_stl(tmp_path / "ascii.stl", triangles)
+    _write_binary_stl(tmp_path / "binary.stl", triangles)
+
+    ascii_tris, binary_tris = read_stl(tmp_path / "ascii.stl"), read_stl(tmp_path / "binary.stl")
+    np.testing.assert_array_equal(ascii_tris, triangles)
+    np.testing.assert_array_equal(binary_tris, triangles)
+
+    verts, faces = weld(binary_tris)
+    np.testing.assert_array_equal(verts[faces], triangles)
+    assert np.isclose(np.ptp(normalize(verts), axis=0).max(), 7.0)
+
+
+def _transforms(num_frames=5):
+    c2w, names = orbit_poses(3)
+    frames = [{'file_path': f"{name}.png", 'transform_matrix': pose.tolist(), 'samples': i}
+              for i, (pose, name) in enumerate(zip(c2w[:num_frames], names))]
+    return {'fl_x': 256.0, 'fl_y': 256.0, 'cx': 256.0, 'cy': 256.0, 'w': 512, 'h': 512, 'frames': frames}
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_pose_store_round_trips_exactly_with_float64(tmp_path, mmap):
+    transforms = _transforms()
+    save_pose_store(tmp_path / "poses.npz", transforms, np.float64)
+
+    assert load_pose_store(tmp_path / "poses.npz", mmap=mmap).to_transforms() == transforms
+    assert load_transforms(str(tmp_path / "poses.npz")) == json.loads(json.dumps(transforms))
+
+
+def test_manifest_resumes_only_intact_views(tmp_path):
+    from PIL import Image
+
+    c2w, names = orbit_poses(2)
+    manifest = RenderManifest(str(tmp_path), "stl", "settings")
+    for pose, name in zip(c2w[:2], names[:2]):
+        Image.new("RGB", (4, 4)).save(tmp_path / f"{name}.png")
+        manifest.record(name, pose, f"{name}.png")
+    manifest.save()
+
+    # truncate the second image, as a killed render would
+    data = (tmp_path / f"{names[1]}.png").read_bytes()
+    (tmp_path / f"{names[1]}.png").write_bytes(data[:-4])
+    assert not png_is_complete(tmp_path / f"{names[1]}.png")
+
+    assert RenderManifest.load(str(tmp_path), "stl", "settings").missing(c2w, names) == [1, 2, 3]
+    # other render settings drop every recorded view
+    assert RenderManifest.load(str(tmp_path), "stl", "other").missing(c2w, names) == [0, 1, 2, 3]
+
+
+def test_half_difference_noise_ignores_edges():
+    rng = np.random.default_rng(0)
+    img = np.zeros((64, 64))
+    img[:, 32:] = 1
+    img[::2] += 0.5
+    a, b = img + rng.normal(0, 0.02, img.shape), img + rng.normal(0, 0.02, img.shape)
+
+    # the noise of the mean of two renders with sigma 0.02 each
+    assert estimate_noise(a, b) == pytest.approx(0.02 / math.sqrt(2), rel=0.05)
+    assert estimate_tile_noise(a, b, tile_size=32).shape == (2, 2)
+    assert estimate_noise(img, img) == 0
+
+
+def test_noisy_region_and_next_samples():
+    tile_noise = np.zeros((4, 4))
+    assert noisy_region(tile_noise, 0.01, tile_size=8) is None
+    tile_noise[1, 2] = tile_noise[2, 3] = 0.05
+    assert noisy_region(tile_noise, 0.01, tile_size=8) == (16, 8, 32, 24)
+
+    assert next_samples(16, 0.011, 0.01, 1024) == 32
+    assert next_samples(16, 0.04, 0.01, 1024) == 256
+    assert next_samples(16, 0.04, 0.01, 100) == 100
+
+
+def test_mask_bbox_and_aabb_scale():
+    mask = np.zeros((10, 20), dtype=bool)
+    assert mask_bbox(mask) is None
+    mask[2:5, 3:9] = True
+    assert mask_bbox(mask) == [3, 2, 8, 4]
+
+    assert aabb_scale(0.1) == 1
+    assert aabb_scale(10) == 8
+    assert aabb_scale(1e6) == 128
+
+
+def test_bounding_radius_of_a_centered_silhouette():
+    # a sphere of radius 1 at distance 5 subtends asin(1 / 5) from the center
+    focal, size = 256.0, 512
+    half = focal * math.tan(math.asin(1 / 5))
+    c = size / 2
+    bbox = [c - half, c - half, c + half - 1, c + half - 1]
+    c2w = look_at(np.array([[5.0, 0, 0]]))
+
+    assert bounding_radius([bbox], c2w, focal, focal, c, c) == pytest.approx(1.0, rel=1e-6)
+
+
+def test_run_jobs_with_stub_commands(tmp_path):
+    jobs = [
+        Job("echo", [sys.executable, "-c", "import sys; print(sys.argv[1:])", "{device}", '{"json": 1}']),
+        Job("echo", [sys.executable, "-c", "raise SystemExit(3)"]),
+        Job("sleep", [sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5),
+    ]
+    results = run_jobs(jobs, devices=["cpu"], log_dir=str(tmp_path))
+
+    assert [r['status'] for r in results] == ["ok", "failed", "timeout"]
+    # repeated names get their own logs, and only {device} is substituted
+    assert sorted(os.listdir(tmp_path)) == ["echo_1.log", "echo_2.log", "jobs_report.json", "sleep.log"]
+    assert "['cpu', '{\"json\": 1}']" in (tmp_path / "echo_1.log").read_text()
@@ -0,0 +1,185 @@
+"""
+Geometry-aware view selection: pick the fewest poses that still see most of
+the mesh surface.
+
+The normalized mesh is covered with area-proportional sample points. Each
+candidate pose (a dense Fibonacci sphere by default) projects them into a
+coarse z-buffer; a sample is visible if it's the nearest one in its pixel.
+That gives the fraction of every face each candidate sees. Views are then
+picked greedily by newly covered surface area, skipping candidates closer
+than min_angle to one already picked, until target_coverage of the area
+seen by any candidate is covered.
+
+    python view_planning.py ../mesh_dir outputs --candidates 512 --coverage 0.95
+    render_dir("../mesh_dir", "outputs", pose_file="outputs/{mesh}/planned_poses.npz")
+"""
+import os
+import math
+import pathlib
+
+import numpy as np
+
+from manifest import file_hash
+from mesh_cache import load_normalized_mesh
+from poses import sample_poses
+from pose_store import save_pose_store
+
+PLANNED_POSES = "planned_poses.npz"
+
+
+def sample_surface(verts, faces, num_samples: int, seed: int = 0):
+    """
+    returns ((M, 3) points, (M,) index of the face each came from, (F,) face areas)
+    with at least one point per face and the rest spread by area
+    """
+    tris = verts[faces]
+    areas = 0.5 * np.linalg.norm(np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0]), axis=-1)
+
+    extra = max(num_samples - len(faces), 0)
+    counts = 1 + np.floor(areas / max(areas.sum(), 1e-12) * extra).astype(np.int64)
+    face_ids = np.repeat(np.arange(len(faces)), counts)
+
+    # uniform barycentric coordinates by reflecting the unit square onto the triangle
+    rng = np.random.default_rng(seed)
+    u, v = rng.random(len(face_ids)), rng.random(len(face_ids))
+    flip = u + v > 1
+    u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+
+    t = tris[face_ids]
+    points = t[:, 0] + u[:, None] * (t[:, 1] - t[:, 0]) + v[:, None] * (t[:, 2] - t[:, 0])
+
+    return points, face_ids, areas
+
+
+def visible_samples(points, c2w, FOV: float = 90, resolution: int = 256, depth_tolerance: float = 0.02):
+    """
+    (M,) bool, which points the camera at c2w sees, by a point z-buffer
+    resolution: z-buffer size, should leave a few samples per pixel so surfaces
+        in front don't leak
+    """
+    rot, eye = c2w[:3, :3], c2w[:3, 3]
+    cam = (points - eye) @ rot              # world -> camera, camera looks down -Z
+    depth = -cam[:, 2]
+
+    focal = 1 / math.tan(math.radians(FOV) / 2)
+    in_front = depth > 1e-6
+    x = focal * cam[:, 0] / np.where(in_front, depth, 1)
+    y = focal * cam[:, 1] / np.where(in_front, depth, 1)
+    in_view = in_front & (np.abs(x) < 1) & (np.abs(y) < 1)
+
+    px = ((x + 1) / 2 * resolution).astype(np.int64).clip(0, resolution - 1)
+    py = ((1 - y) / 2 * resolution).astype(np.int64).clip(0, resolution - 1)
+    pixel = py * resolution + px
+
+    zbuffer = np.full(resolution * resolution, np.inf)
+    np.minimum.at(zbuffer, pixel[in_view], depth[in_view])
+
+    return in_view & (depth <= zbuffer[pixel] * (1 + depth_tolerance))
+
+
+def face_visibility(verts, faces, c2w, FOV: float = 90, resolution: int = 256, samples_per_pixel: float = 4,
+                    seed: int = 0):
+    """
+    returns ((N, F) fraction of each face seen from each pose, (F,) face areas)
+    """
+    points, face_ids, areas = sample_surface(verts, faces, int(samples_per_pixel * resolution ** 2), seed)
+    counts = np.bincount(face_ids, minlength=len(faces))
+
+    visibility = np.empty((len(c2w), len(faces)), dtype=np.float32)
+    for i, pose in enumerate(np.asarray(c2w)):
+        seen = visible_samples(points, pose, FOV, resolution)
+        visibility[i] = np.bincount(face_ids, weights=seen, minlength=len(faces)) / counts
+
+    return visibility, areas
+
+
+def greedy_views(visibility, areas, directions, target_coverage: float = 0.95, min_angle: float = 10,
+                 max_views: int = None):
+    """
+    visibility: (N, F) from face_visibility, directions: (N, 3) unit view directions
+    returns (indices of picked candidates in pick order, coverage reached)
+
+    Coverage is relative to the area any candidate sees, surfaces hidden from
+    every candidate (e.g. the inside of a closed mesh) don't count.
+    """
+    reachable = float(areas @ visibility.max(axis=0))
+    if reachable <= 0:
+        return [], 0.0
+
+    cos_min = math.cos(math.radians(min_angle))
+    allowed = np.ones(len(visibility), dtype=bool)
+    covered = np.zeros(visibility.shape[1], dtype=np.float32)
+    picked, coverage = [], 0.0
+
+    while coverage < target_coverage and allowed.any() and (max_views is None or len(picked) < max_views):
+        gain = np.maximum(visibility - covered, 0) @ areas
+        gain[~allowed] = -1
+        best = int(np.argmax(gain))
+        if gain[best] <= 0:
+            break
+
+        picked.append(best)
+        covered = np.maximum(covered, visibility[best])
+        coverage = float(areas @ covered) / reachable
+        allowed &= directions @ directions[best] < cos_min
+
+    return picked, coverage
+
+
+def plan_views(verts, faces, num_candidates: int = 512, radius: float = math.sqrt(30), FOV: float = 90,
+               target_coverage: float = 0.95, min_angle: float = 10, max_views: int = None,
+               upper_hemisphere: bool = False, resolution: int = 256, seed: int = 0):
+    """
+    returns ((K, 4, 4) camera-to-world matrices, frame names, coverage reached)
+    """
+    c2w, _ = sample_poses('fibonacci', num_candidates, radius, upper_hemisphere)
+    directions = c2w[:, :3, 3] / np.linalg.norm(c2w[:, :3, 3], axis=-1, keepdims=True)
+
+    visibility, areas = face_visibility(verts, faces, c2w, FOV, resolution, seed=seed)
+    picked, coverage = greedy_views(visibility, areas, directions, target_coverage, min_angle, max_views)
+
+    # names keep the candidate index, so replanning with other settings reuses matching renders
+    names = [f"view_{i:04d}" for i in picked]
+    return c2w[picked], names, coverage
+
+
+def plan_dir(mesh_dir: str, output_dir: str, cache_dir: str = None, max_faces: int = 20000, **plan_kwargs):
+    """
+    Writes {output_dir}/{mesh}/planned_poses.npz for every STL in mesh_dir,
+    for render_dir(..., pose_file="{output_dir}/{mesh}/planned_poses.npz").
+    max_faces: decimate before planning, visibility doesn't need full detail
+    """
+    cache_dir = cache_dir or os.path.join(output_dir, "mesh_cache")
+    results = {}
+    for stl_fname in sorted(pathlib.Path(mesh_dir).glob('**/*.stl')):
+        verts, faces = load_normalized_mesh(stl_fname, cache_dir, max_faces=max_faces, stl_hash=file_hash(stl_fname))
+        c2w, names, coverage = plan_views(verts, faces, **plan_kwargs)
+
+        mesh_output_dir = os.path.join(output_dir, stl_fname.stem)
+        os.makedirs(mesh_output_dir, exist_ok=True)
+        frames = [{'file_path': f"{name}.png", 'transform_matrix': pose.tolist()} for pose, name in zip(c2w, names)]
+        save_pose_store(os.path.join(mesh_output_dir, PLANNED_POSES), {'coverage': coverage, 'frames': frames},
+                        np.float64)
+
+        results[stl_fname.stem] = {'views': len(names), 'coverage': coverage}
+        print(f"{stl_fname.stem}: {len(names)} views, {coverage:.1%} coverage")
+
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mesh_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--candidates", type=int, default=512)
+    parser.add_argument("--coverage", type=float, default=0.95)
+    parser.add_argument("--min-angle", type=float, default=10)
+    parser.add_argument("--max-views", type=int, default=None)
+    parser.add_argument("--fov", type=float, default=90)
+    parser.add_argument("--upper-hemisphere", action="store_true")
+    args = parser.parse_args()
+
+    plan_dir(args.mesh_dir, args.output_dir, num_candidates=args.candidates, target_coverage=args.coverage,
+             min_angle=args.min_angle, max_views=args.max_views, FOV=args.fov, upper_hemisphere=args.upper_hemisphere)